@@ -0,0 +1,177 @@
+import re
+from bisect import bisect_left
+
+# ==========================================
+# 1. TOKENIZATION (done once per request)
+# ==========================================
+# Words, single punctuation marks and whitespace runs; the split
+# UBigkasProcessor has always used, so joining the tokens gives back the text.
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\s+", re.UNICODE)
+
+WORD, PUNCT, SPACE = "word", "punct", "space"
+
+def _kind(text):
+    if text[0].isspace():
+        return SPACE
+    return WORD if re.match(r"\w", text) else PUNCT
+
+class Token:
+    """
+    One span of the original text. Pipeline stages annotate it in place:
+    spelling fills `norm` (slang-expanded) and `correction`, tagging fills
+    `tag` / `tag_score`.
+    """
+    __slots__ = ("text", "start", "end", "kind", "norm", "correction", "tag", "tag_score")
+
+    def __init__(self, text, start, end, kind):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.kind = kind
+        self.norm = None
+        self.correction = None
+        self.tag = None
+        self.tag_score = None
+
+    @property
+    def output(self):
+        """Latest form of this token after whichever stages have run."""
+        if self.correction is not None:
+            return self.correction
+        return self.norm if self.norm is not None else self.text
+
+    def __repr__(self):
+        return f"Token({self.text!r}, {self.start}, {self.end}, {self.kind})"
+
+class Span:
+    """Tokens [first, last) covering text[start:end]; `info` holds a stage's annotation."""
+    __slots__ = ("start", "end", "first", "last", "text", "info")
+
+    def __init__(self, start, end, first, last, text):
+        self.start = start
+        self.end = end
+        self.first = first
+        self.last = last
+        self.text = text
+        self.info = None
+
+    def __repr__(self):
+        return f"Span({self.text!r}, {self.start}, {self.end})"
+
+# ==========================================
+# 2. DOCUMENT
+# ==========================================
+class Document:
+    """
+    The text of one request, tokenized once into offset spans. Sentences
+    and words are views over the same token list, so stages pass the
+    document along instead of joining and re-splitting strings, and every
+    change keeps the character offsets of the text it replaced.
+    """
+
+    def __init__(self, text, split_sentences=None):
+        self.text = text
+        self.tokens = [Token(m.group(), m.start(), m.end(), _kind(m.group()))
+                       for m in TOKEN_PATTERN.finditer(text)]
+        self.sentences = self._sentence_spans(split_sentences(text) if split_sentences else [text])
+        self.annotations = {}
+        self._words = None
+
+    def _sentence_spans(self, pieces):
+        # Sentence splitters return substrings; find each one after the previous
+        starts = [t.start for t in self.tokens]
+        spans = []
+        pos = 0
+        for piece in pieces:
+            start = self.text.find(piece, pos)
+            if start < 0 or not piece:
+                continue
+            end = pos = start + len(piece)
+            spans.append(Span(start, end, bisect_left(starts, start), bisect_left(starts, end), piece))
+        if not spans and self.tokens:
+            spans.append(Span(0, len(self.text), 0, len(self.tokens), self.text))
+        return spans
+
+    def token_range(self, index=None):
+        """Token positions of sentence `index`, or of the whole document."""
+        if index is None:
+            return range(len(self.tokens))
+        sentence = self.sentences[index]
+        return range(sentence.first, sentence.last)
+
+    def output_text(self, index=None):
+        return "".join(self.tokens[i].output for i in self.token_range(index))
+
+    def output_words(self, index=None):
+        """
+        Whitespace-separated words of the current output (what
+        `output_text(index).split()` gives) plus, for each word, the
+        position of the token it starts in.
+        """
+        words, owners = [], []
+        current, owner = [], None
+
+        def flush():
+            nonlocal current, owner
+            if current:
+                words.append("".join(current))
+                owners.append(owner)
+            current, owner = [], None
+
+        for pos in self.token_range(index):
+            out = self.tokens[pos].output
+            if not out:
+                continue
+            if out[0].isspace():
+                flush()
+            for j, part in enumerate(out.split()):
+                if j:
+                    flush()
+                if owner is None:
+                    owner = pos
+                current.append(part)
+            if out[-1].isspace():
+                flush()
+        flush()
+        return words, owners
+
+    def words(self):
+        """
+        Word spans over the original text, with hyphenated words kept whole
+        (the same words `\\b[\\w-]+\\b` finds). Built once and cached, so
+        morphology and structure detection annotate the same objects.
+        """
+        if self._words is None:
+            self._words = []
+            run = []
+            for pos, tok in enumerate(self.tokens + [None]):
+                if tok is not None and (tok.kind == WORD or tok.text == "-") and \
+                        (not run or self.tokens[run[-1]].end == tok.start):
+                    run.append(pos)
+                    continue
+                # Trim hyphens at the edges of the run
+                while run and self.tokens[run[0]].kind != WORD:
+                    run.pop(0)
+                while run and self.tokens[run[-1]].kind != WORD:
+                    run.pop()
+                if run:
+                    first, last = self.tokens[run[0]], self.tokens[run[-1]]
+                    self._words.append(Span(first.start, last.end, run[0], run[-1] + 1,
+                                            self.text[first.start:last.end]))
+                run = [pos] if tok is not None and tok.kind == WORD else []
+        return self._words
+
+    def set_tags(self, owners, tags, scores):
+        for pos, tag, score in zip(owners, tags, scores):
+            self.tokens[pos].tag = tag
+            self.tokens[pos].tag_score = score
+
+    def edits(self, index=None):
+        """Character-offset edits from the original text to the current output."""
+        edits = []
+        for pos in self.token_range(index):
+            tok = self.tokens[pos]
+            if tok.output != tok.text:
+                edits.append({"start": tok.start, "end": tok.end,
+                              "original": tok.text, "replacement": tok.output})
+        return edits
@@ -1,10 +1,17 @@
 import logging
 import re
 import os
+import time
 import nltk
 import torch
 from transformers import MarianMTModel, MarianTokenizer
+from tokenization import load_tokenizer
 from nltk.tokenize import sent_tokenize
+from serving import stage_limiter
+from profiling import current_trace
+from model_registry import REGISTRY
+from document import Document
+from pipelining import run_pipeline
 
 # 1. INTEGRATION: Import custom components
 # Ensure ubigkas_processor.py and marker_roberta.py are in the same folder
@@ -14,23 +21,50 @@ except ImportError:
     logging.warning("ubigkas_processor.py not found. Spelling correction will be disabled.")
     class UBigkasProcessor:
         def __init__(self, model_path): pass
-        def process_sentence(self, text): return text
+        def process_sentence(self, text, rerank=True): return text
+        def annotate(self, doc, index=None, rerank=True): pass
 
 try:
     # This imports the logic from your marker_roberta.py file
-    from marker_roberta import predict_tags, insert_markers
+    from marker_roberta import TaggerUnavailable, predict_tags, insert_markers
     HAS_MARKER_MODEL = True
 except ImportError:
     logging.warning("marker_roberta.py not found in the current directory.")
     # Fallback dummies if file is missing
-    def predict_tags(text): return text.split(), ["O"] * len(text.split()), [1.0] * len(text.split())
+    def predict_tags(text):
+        tokens = text.split() if isinstance(text, str) else list(text)
+        return tokens, ["O"] * len(tokens), [1.0] * len(tokens)
     def insert_markers(tokens, tags, scores): return " ".join(tokens)
+    class TaggerUnavailable(RuntimeError): pass
     HAS_MARKER_MODEL = False
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Model stages that get their own in-flight limit (see serving.StageLimiter)
+PIPELINE_STAGES = ("spelling", "tagging", "bridge", "final")
+
+# Steps taken, in order, when a request's latency budget runs short
+DEGRADATION_LEVELS = ("full", "reduced_beams", "no_rerank", "spelling_only")
+FULL_BEAMS = 4
+REDUCED_BEAMS = 1
+
+class Deadline:
+    """Wall-clock budget for one request; `budget_ms=None` never runs out."""
+
+    def __init__(self, budget_ms=None):
+        self.start = time.perf_counter()
+        self.budget = budget_ms / 1000.0 if budget_ms else None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        if self.budget is None:
+            return float("inf")
+        return self.budget - self.elapsed()
+
 class FilipinoGrammarCorrector:
     """
     Hybrid Pipeline for Filipino Grammar Correction:
@@ -43,7 +77,9 @@ class FilipinoGrammarCorrector:
                  # UPDATE 2: Point to your existing Fine-Tuned EN-TL model on Hugging Face
                  en_tl_model="Vinci14/final_tagalog_translator", 
                  # UPDATE 3: Point to your Spelling model
-                 spelling_model_path="Vinci14/my_spelling_model"): 
+                 spelling_model_path="Vinci14/my_spelling_model",
+                 stage_limits=None,
+                 default_budget_ms=None): 
         
         # Setup NLTK
         try:
@@ -54,8 +90,14 @@ class FilipinoGrammarCorrector:
         self.tl_en_model_name = tl_en_model
         self.en_tl_model_name = en_tl_model
         self.spelling_model_path = spelling_model_path
+        # Bounded concurrency per model stage; callers beyond the queue get ServerBusy
+        self.stage_limits = stage_limits or {name: stage_limiter(name) for name in PIPELINE_STAGES}
+        # Latency budget applied when a caller does not pass one (None = unlimited)
+        self.default_budget_ms = default_budget_ms
+        # Moving average of seconds per stage variant, used to plan within a budget
+        self.stage_costs = {}
         
-        # Load Translation components
+        # Register Translation components (loaded lazily)
         self._load_models()
         
         # Load Spelling components
@@ -63,44 +105,37 @@ class FilipinoGrammarCorrector:
         self.ubigkas = UBigkasProcessor(model_path=self.spelling_model_path)
 
     def _load_models(self):
-        try:
-            # --- LOAD TL-EN MODEL (Tagalog -> English Bridge) ---
-            logger.info(f"Loading Fine-Tuned TL-EN Bridge from: {self.tl_en_model_name}")
-            try:
-                self.tl_en_tokenizer = MarianTokenizer.from_pretrained(self.tl_en_model_name)
-                self.tl_en_model = MarianMTModel.from_pretrained(self.tl_en_model_name)
-            except Exception as e:
-                logger.warning(f"Failed to load custom TL-EN model. Fallback to generic: {e}")
-                self.tl_en_tokenizer = MarianTokenizer.from_pretrained("Helsinki-NLP/opus-mt-tl-en")
-                self.tl_en_model = MarianMTModel.from_pretrained("Helsinki-NLP/opus-mt-tl-en")
-
-            # --- LOAD EN-TL MODEL (English -> Tagalog Correction) ---
-            logger.info(f"Loading Fine-Tuned EN-TL Correction Model from: {self.en_tl_model_name}")
-            try:
-                self.en_tl_tokenizer = MarianTokenizer.from_pretrained(self.en_tl_model_name)
-                self.en_tl_model = MarianMTModel.from_pretrained(self.en_tl_model_name)
-            except Exception as e:
-                logger.warning(f"Failed to load custom EN-TL model. Fallback to generic: {e}")
-                self.en_tl_tokenizer = MarianTokenizer.from_pretrained("Helsinki-NLP/opus-mt-en-tl")
-                self.en_tl_model = MarianMTModel.from_pretrained("Helsinki-NLP/opus-mt-en-tl")
+        # Registered only; each model loads on first use and is shared per process
+        self.tl_en_key = REGISTRY.register(
+            f"marian:{self.tl_en_model_name}",
+            lambda: self._load_marian("TL-EN Bridge", self.tl_en_model_name, "Helsinki-NLP/opus-mt-tl-en"))
+        self.en_tl_key = REGISTRY.register(
+            f"marian:{self.en_tl_model_name}",
+            lambda: self._load_marian("EN-TL Correction Model", self.en_tl_model_name, "Helsinki-NLP/opus-mt-en-tl"))
 
-            if HAS_MARKER_MODEL:
-                logger.info("Marker RoBERTa logic detected and ready for Stage 3.")
+        if HAS_MARKER_MODEL:
+            logger.info("Marker RoBERTa logic detected and ready for Stage 3.")
 
+    def _load_marian(self, label, model_name, fallback_name):
+        logger.info(f"Loading Fine-Tuned {label} from: {model_name}")
+        try:
+            return load_tokenizer(model_name, MarianTokenizer), MarianMTModel.from_pretrained(model_name)
         except Exception as e:
-            logger.error(f"Critical error loading models: {e}")
-            raise
+            logger.warning(f"Failed to load custom {label}. Fallback to generic: {e}")
+            return load_tokenizer(fallback_name, MarianTokenizer), MarianMTModel.from_pretrained(fallback_name)
 
     def translate_tl_to_en(self, text):
-        inputs = self.tl_en_tokenizer([text], return_tensors="pt", padding=True, truncation=True)
-        translated = self.tl_en_model.generate(**inputs)
-        return self.tl_en_tokenizer.decode(translated[0], skip_special_tokens=True)
+        with REGISTRY.use(self.tl_en_key) as (tokenizer, model):
+            inputs = tokenizer([text], return_tensors="pt", padding=True, truncation=True)
+            translated = model.generate(**inputs)
+            return tokenizer.decode(translated[0], skip_special_tokens=True)
 
-    def translate_en_to_tl(self, text):
-        inputs = self.en_tl_tokenizer([text], return_tensors="pt", padding=True, truncation=True)
-        # Using beams=4 for higher quality during reconstruction
-        translated = self.en_tl_model.generate(**inputs, max_length=512, num_beams=4)
-        return self.en_tl_tokenizer.decode(translated[0], skip_special_tokens=True)
+    def translate_en_to_tl(self, text, num_beams=FULL_BEAMS):
+        with REGISTRY.use(self.en_tl_key) as (tokenizer, model):
+            inputs = tokenizer([text], return_tensors="pt", padding=True, truncation=True)
+            # Using beams=4 for higher quality during reconstruction
+            translated = model.generate(**inputs, max_length=512, num_beams=num_beams)
+            return tokenizer.decode(translated[0], skip_special_tokens=True)
 
     def _refine_english(self, text):
         # Normalize the English bridge to help the decoder
@@ -115,42 +150,149 @@ class FilipinoGrammarCorrector:
             text += '.'
         return text
 
-    def _process_single_sentence(self, sentence):
-        """Helper to process one sentence at a time."""
+    # --- Stage cost tracking ---
+    def _timed(self, key, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            cost = time.perf_counter() - started
+            prev = self.stage_costs.get(key)
+            self.stage_costs[key] = cost if prev is None else 0.8 * prev + 0.2 * cost
+            trace = current_trace()
+            if trace is not None:
+                trace.record_stage(key, cost)
+
+    def _estimate(self, *keys):
+        # Unknown stages cost 0 so the first requests run at full quality and get measured
+        return sum(self.stage_costs.get(k, 0.0) for k in keys)
+
+    def _plan_level(self, time_left):
+        """Cheapest degradation level whose estimated cost fits in `time_left`."""
+        plans = (
+            ("spelling", "tagging", "bridge", f"final@{FULL_BEAMS}"),
+            ("spelling", "tagging", "bridge", f"final@{REDUCED_BEAMS}"),
+            ("spelling_no_rerank", "tagging", "bridge", f"final@{REDUCED_BEAMS}"),
+        )
+        for level, keys in enumerate(plans):
+            if self._estimate(*keys) <= time_left:
+                return level
+        return DEGRADATION_LEVELS.index("spelling_only")
+
+    # --- Stages of one sentence (run back to back, or pipelined across sentences) ---
+    def _spelling_and_tagging(self, doc, index, deadline, sentences_left):
+        """Stages 1-2; the only ones that touch the Document. Returns the sentence's stage state."""
+        level = self._plan_level(deadline.remaining() / max(sentences_left, 1))
+
         # 1. CLEANED (Spelling Fixes)
-        cleaned = self.ubigkas.process_sentence(sentence)
+        rerank = level < DEGRADATION_LEVELS.index("no_rerank")
+        with self.stage_limits["spelling"].slot():
+            self._timed("spelling" if rerank else "spelling_no_rerank",
+                        self.ubigkas.annotate, doc, index, rerank=rerank)
+        cleaned = doc.output_text(index)
+        state = {"cleaned": cleaned, "tagged": None, "bridge": None, "final": cleaned, "level": level}
+        if level == DEGRADATION_LEVELS.index("spelling_only"):
+            return state
 
         # 2. TAGGED/FIXED (RoBERTa Tagging + Marker Insertion + Conjugation)
         if HAS_MARKER_MODEL:
             try:
                 # Capture tokens, tags, AND SCORES (The Fix)
-                tokens, tags, scores = predict_tags(cleaned)
+                words, owners = doc.output_words(index)
+                with self.stage_limits["tagging"].slot():
+                    tokens, tags, scores = self._timed("tagging", predict_tags, words)
+                doc.set_tags(owners, tags, scores)
                 # Pass ALL THREE to insert_markers
                 tagged = insert_markers(tokens, tags, scores)
             except ValueError as e:
                 logger.error(f"Mismatch in RoBERTa output: {e}")
                 tagged = cleaned
+            except TaggerUnavailable as e:
+                # Same result as running without marker_roberta: the spelling fix goes on untagged
+                logger.error(f"Tagger unavailable, skipping marker insertion: {e}")
+                tagged = cleaned
         else:
             tagged = cleaned
+        state["tagged"] = tagged
+        return state
+
+    def _bridge_stage(self, state, deadline, sentences_left):
+        if state["tagged"] is None:
+            return state
+        # Both translation stages must still fit, or the spelling fix is all we can return
+        time_left = deadline.remaining() / max(sentences_left, 1)
+        if self._estimate("bridge", f"final@{REDUCED_BEAMS}") > time_left:
+            return dict(state, tagged=None, level=DEGRADATION_LEVELS.index("spelling_only"))
         
         # 3. BRIDGE (EN)
-        english_raw = self.translate_tl_to_en(tagged)
-        bridge = self._refine_english(english_raw)
+        with self.stage_limits["bridge"].slot():
+            english_raw = self._timed("bridge", self.translate_tl_to_en, state["tagged"])
+        state["bridge"] = self._refine_english(english_raw)
+        return state
 
+    def _final_stage(self, state, deadline, sentences_left):
+        if state["bridge"] is None:
+            return state
         # 4. FINAL (TL)
-        marian_raw = self.translate_en_to_tl(bridge)
-        final = self._post_process_filipino(marian_raw)
-        
-        return cleaned, tagged, bridge, final
+        level = state["level"]
+        time_left = deadline.remaining() / max(sentences_left, 1)
+        beams = FULL_BEAMS if level == 0 and self._estimate(f"final@{FULL_BEAMS}") <= time_left else REDUCED_BEAMS
+        state["level"] = max(level, 0 if beams == FULL_BEAMS else DEGRADATION_LEVELS.index("reduced_beams"))
+        with self.stage_limits["final"].slot():
+            marian_raw = self._timed(f"final@{beams}", self.translate_en_to_tl, state["bridge"], num_beams=beams)
+        state["final"] = self._post_process_filipino(marian_raw)
+        return state
 
-    def correct_grammar_with_pipeline(self, text):
-        """ Runs the full hybrid pipeline on multiple sentences. """
-        if not text.strip(): return
+    def _process_sentences(self, doc, indices, deadline):
+        """
+        Stage outputs for the sentences at `indices`, in order. Sentences
+        overlap: while one is in MarianMT decoding, the next one's spelling
+        and tagging (plain Python plus a RoBERTa pass) already run, with
+        bounded queues in between (see pipelining.run_pipeline). Each stage
+        splits the remaining budget over the sentences it has yet to handle;
+        run back to back, that is the same split as before.
+        """
+        # One count per stage, each touched only by that stage's thread
+        left = {name: len(indices) for name in ("spelling", "bridge", "final")}
+
+        def _stage(name, fn):
+            def run(item):
+                try:
+                    return fn(item, left[name])
+                finally:
+                    left[name] -= 1
+            return name, run
+
+        states = run_pipeline(indices, [
+            _stage("spelling", lambda i, n: self._spelling_and_tagging(doc, i, deadline, n)),
+            _stage("bridge", lambda state, n: self._bridge_stage(state, deadline, n)),
+            _stage("final", lambda state, n: self._final_stage(state, deadline, n)),
+        ])
+        return {i: (s["cleaned"], s["tagged"], s["bridge"], s["final"], s["level"])
+                for i, s in zip(indices, states)}
+
+    def correct_with_report(self, text, budget_ms=None, reuse=None):
+        """
+        Runs the full hybrid pipeline on multiple sentences within an
+        optional latency budget and reports what it had to give up.
+        `reuse` maps sentence text to a per-sentence result from an earlier
+        report; those sentences are not run again.
+        """
+        if not text.strip():
+            return None
+        deadline = Deadline(budget_ms if budget_ms is not None else self.default_budget_ms)
+        reuse = reuse if reuse is not None else {}
         
-        # Split input into sentences
-        sentences = sent_tokenize(text.strip())
+        # Tokenize and split into sentences once; stages annotate this document
+        doc = Document(text.strip(), split_sentences=sent_tokenize)
+        sentences = [s.text for s in doc.sentences]
+        processed = self._process_sentences(
+            doc, [i for i, s in enumerate(sentences) if s not in reuse], deadline)
         
         final_output_parts = []
+        sentence_results = []
+        edits = []
+        worst_level = 0
         
         print("\n" + "="*80)
         print(f"{'PIPELINE STAGE':<20} | {'CONTENT'}")
@@ -159,23 +301,59 @@ class FilipinoGrammarCorrector:
         print("-" * 80)
 
         for i, sentence in enumerate(sentences):
-            cleaned, tagged, bridge, final = self._process_single_sentence(sentence)
-            
-            # Print details for this sentence
+            span = doc.sentences[i]
             prefix = f"[Sent {i+1}] "
-            print(f"{prefix + 'CLEANED':<20} | {cleaned}")
-            print(f"{prefix + 'TAGGED':<20} | {tagged}")
-            print(f"{prefix + 'BRIDGE':<20} | {bridge}")
-            print(f"{prefix + 'FINAL':<20} | {final}")
+            if sentence in reuse:
+                result = dict(reuse[sentence], reused=True)
+                print(f"{prefix + 'REUSED':<20} | {result['corrected']}")
+            else:
+                cleaned, tagged, bridge, final, level = processed[i]
+                result = {
+                    "text": sentence,
+                    "corrected": final,
+                    "degradation": DEGRADATION_LEVELS[level],
+                    "degradation_level": level,
+                    # Intermediate outputs; tagged/bridge are None when degraded to spelling only
+                    "stages": {"cleaned": cleaned, "tagged": tagged, "bridge": bridge, "final": final},
+                    # Offsets relative to the sentence, so a reused result fits wherever it moves
+                    "edits": [dict(e, start=e["start"] - span.start, end=e["end"] - span.start)
+                              for e in doc.edits(i)],
+                    "reused": False,
+                }
+            
+                # Print details for this sentence
+                print(f"{prefix + 'CLEANED':<20} | {cleaned}")
+                print(f"{prefix + 'TAGGED':<20} | {tagged}")
+                print(f"{prefix + 'BRIDGE':<20} | {bridge}")
+                print(f"{prefix + 'FINAL':<20} | {final}")
+                print(f"{prefix + 'DEGRADATION':<20} | {result['degradation']}")
             print("-" * 80)
             
-            final_output_parts.append(final)
+            worst_level = max(worst_level, result["degradation_level"])
+            edits.extend(dict(e, start=e["start"] + span.start, end=e["end"] + span.start) for e in result["edits"])
+            sentence_results.append(result)
+            final_output_parts.append(result["corrected"])
 
         full_final_output = " ".join(final_output_parts)
         print(f"{'FULL OUTPUT':<20} | {full_final_output}")
         print("="*80 + "\n")
 
-        return full_final_output
+        return {
+            "corrected": full_final_output,
+            "degradation": DEGRADATION_LEVELS[worst_level],
+            "degradation_level": worst_level,
+            "budget_ms": deadline.budget * 1000 if deadline.budget is not None else None,
+            "elapsed_ms": round(deadline.elapsed() * 1000, 1),
+            # Spelling fixes as offsets into the input (after leading whitespace is stripped)
+            "edits": edits,
+            "sentences": sentence_results,
+            "document": doc,
+        }
+
+    def correct_grammar_with_pipeline(self, text, budget_ms=None):
+        """ Runs the full hybrid pipeline on multiple sentences. """
+        report = self.correct_with_report(text, budget_ms)
+        return report["corrected"] if report else None
 
     def interactive_mode(self):
         print("--- Filipino Grammar Corrector (V3 - Dual Fine-Tuned Models) ---")
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from flask import make_response, request
+
+# How long browsers / proxies may reuse a response without revalidating
+DEFAULT_MAX_AGE = int(os.environ.get("UBIGKAS_CACHE_MAX_AGE", 600))
+
+class ResultCache:
+    """Thread-safe LRU of response payloads keyed by their ETag."""
+
+    def __init__(self, max_entries=int(os.environ.get("UBIGKAS_RESULT_CACHE_SIZE", 5000))):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def normalize_sentence(sentence):
+    """NFC + collapsed whitespace, so trivially different inputs share a cache key."""
+    return " ".join(unicodedata.normalize("NFC", sentence).split())
+
+def fingerprint_values(*values):
+    return hashlib.sha256("\x1f".join(str(v) for v in values).encode("utf-8")).hexdigest()[:16]
+
+def sentence_etag(endpoint, sentence, *versions):
+    """
+    The ETag depends only on the request (endpoint + normalized sentence)
+    and the versions that can change its answer, so it can be checked
+    before any work is done. Responses carry it as a weak ETag since only
+    the meaning of the JSON body, not its exact bytes, is guaranteed.
+    """
+    return fingerprint_values(endpoint, normalize_sentence(sentence), *versions)
+
+def request_json():
+    """The JSON body: {} when there is none, None when it is not an object."""
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    return data if isinstance(data, dict) else None
+
+def request_sentence():
+    """The `sentence` from a GET query string or a POST JSON body."""
+    if request.method == "GET":
+        sentence = request.args.get("sentence", "")
+    else:
+        sentence = (request_json() or {}).get("sentence", "")
+    return normalize_sentence(sentence) if isinstance(sentence, str) else ""
+
+def is_not_modified(etag):
+    return request.method == "GET" and request.if_none_match.contains_weak(etag)
+
+def cacheable(response, etag, max_age=DEFAULT_MAX_AGE):
+    response.set_etag(etag, weak=True)
+    if request.method == "GET":
+        response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    else:
+        # POST bodies are never reused by caches; the ETag still lets clients compare
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def not_modified(etag, max_age=DEFAULT_MAX_AGE):
+    response = make_response("", 304)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return response
@@ -1,9 +1,12 @@
 import torch
 import re
 import os
-import sys
+import json
 import torch.nn.functional as F
-from transformers import AutoTokenizer, AutoModelForTokenClassification
+from transformers import AutoModelForTokenClassification
+from model_registry import REGISTRY
+from tokenization import load_tokenizer
+from resources import RESOURCES
 
 # ==========================================
 # 1. CONFIGURATION
@@ -12,27 +15,16 @@ from transformers import AutoTokenizer, AutoModelForTokenClassification
 MODEL_PATH = "Vinci14/tagalog_ner_model"
 CONFIDENCE_THRESHOLD = 0.85 
 
-# MASTER DICTIONARY (Finalized with Rural, Medical, and Modern contexts)
-VERB_TYPES = {
-    # MAG verbs
-    "luto": "MAG", "laro": "MAG", "tanim": "MAG", "aral": "MAG", 
-    "linis": "MAG", "trabaho": "MAG", "dilig": "MAG", "pitas": "MAG",
-    "nood": "MAG", "pasa": "MAG", "type": "MAG", "tago": "MAG",
-    "gamot": "MAG", "bilang": "MAG", "pirma": "MAG", "punas": "MAG",
-    "parada": "MAG", "pasyal": "MAG", "pinta": "MAG", "tugtog": "MAG",
-    "kanta": "MAG", "film": "MAG", "ensayo": "MAG", "pakain": "MAG",
-    "celebrate": "MAG", "report": "MAG", "pila": "MAG",
-    # UM verbs
-    "kain": "UM", "inom": "UM", "punta": "UM", "bili": "UM", 
-    "alis": "UM", "iyak": "UM", "sakay": "UM", "takbo": "UM",
-    "uwi": "UM", "dating": "UM", "pasok": "UM", "labas": "UM",
-    "kuha": "UM", "tawak": "UM", "baba": "UM", "ani": "UM",
-    "simba": "UM", "ihip": "UM", "sikat": "UM", "lubog": "UM", "yanig": "UM",
-    # IN verbs
-    "basa": "IN", "sulat": "IN", "gamit": "IN", "dala": "IN", "huli": "IN", "buhos": "IN",
-    # AN verbs
-    "hugas": "AN", "bukas": "AN", "sarado": "AN", "bayad": "AN", "bigay": "AN"
-}
+# MASTER DICTIONARY (Finalized with Rural, Medical, and Modern contexts):
+# root -> conjugation class, kept in verb_types.json grouped by class
+VERB_TYPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "verb_types.json")
+
+def load_verb_types(path):
+    with open(path, "r", encoding="utf-8") as f:
+        groups = json.load(f)
+    return {root.lower(): v_type for v_type, roots in groups.items() for root in roots}
+
+RESOURCES.register("verb_types", [VERB_TYPES_PATH], load_verb_types)
 
 PAST_KEYWORDS = {"kahapon", "kanina", "noon", "kagabi", "nakaraan", "dati", "noong"}
 FUTURE_KEYWORDS = {"bukas", "mamaya", "susunod", "balang_araw", "sa"}
@@ -93,56 +85,61 @@ def conjugate(root, v_type, tense):
 # ==========================================
 # 3. PREDICTION & RECONSTRUCTION
 # ==========================================
-tokenizer = None
-model = None
+class TaggerUnavailable(RuntimeError):
+    """The tagger checkpoint could not be loaded; callers skip marker insertion."""
 
-def load_model():
-    global tokenizer, model
-    if model is None:
-        print(f"Loading model from {MODEL_PATH}...")
-        try:
-            # use_fast=True is important for correct word_id mapping
-            tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH, use_fast=True)
-            model = AutoModelForTokenClassification.from_pretrained(MODEL_PATH)
-            model.eval()
-            print("Model loaded successfully.")
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            sys.exit(1)
+def _load():
+    print(f"Loading model from {MODEL_PATH}...")
+    try:
+        # A fast tokenizer is required for correct word_id mapping
+        tokenizer = load_tokenizer(MODEL_PATH)
+        model = AutoModelForTokenClassification.from_pretrained(MODEL_PATH)
+    except Exception as e:
+        # Loading is lazy, so this runs inside a request (or pipeline thread): raise, don't exit
+        raise TaggerUnavailable(f"Error loading model from {MODEL_PATH}: {e}") from e
+    model.eval()
+    print("Model loaded successfully.")
+    return tokenizer, model
+
+# Owned by the shared registry so it is loaded lazily and can be evicted
+MODEL_KEY = REGISTRY.register(f"tagger:{MODEL_PATH}", _load)
 
 def predict_tags(sentence):
-    load_model()
-    tokens = sentence.split()
+    # Pinned while it runs, so a memory-budget eviction cannot unload it mid-inference
+    with REGISTRY.use(MODEL_KEY) as (tokenizer, model):
+        # Accepts a string or words already split by the caller (Document.output_words)
+        tokens = sentence.split() if isinstance(sentence, str) else list(sentence)
     
-    # Tokenize with offset mapping to align subwords to original words
-    inputs = tokenizer(tokens, is_split_into_words=True, return_tensors="pt")
+        # Tokenize with offset mapping to align subwords to original words
+        inputs = tokenizer(tokens, is_split_into_words=True, return_tensors="pt")
     
-    with torch.no_grad():
-        logits = model(**inputs).logits
-        probs = F.softmax(logits, dim=-1)
+        with torch.no_grad():
+            logits = model(**inputs).logits
+            probs = F.softmax(logits, dim=-1)
     
-    confidences, pred_ids = torch.max(probs, dim=-1)
-    pred_ids = pred_ids[0].tolist()
-    confidences = confidences[0].tolist()
-    word_ids = inputs.word_ids(batch_index=0)
+        confidences, pred_ids = torch.max(probs, dim=-1)
+        pred_ids = pred_ids[0].tolist()
+        confidences = confidences[0].tolist()
+        word_ids = inputs.word_ids(batch_index=0)
     
-    tags = []
-    scores = []
-    used_word = set()
+        tags = []
+        scores = []
+        used_word = set()
     
-    # Iterate through tokens and pick the label of the first sub-token for each word
-    for pid, score, wid in zip(pred_ids, confidences, word_ids):
-        if wid is not None and wid not in used_word:
-            tags.append(model.config.id2label[pid])
-            scores.append(score)
-            used_word.add(wid)
+        # Iterate through tokens and pick the label of the first sub-token for each word
+        for pid, score, wid in zip(pred_ids, confidences, word_ids):
+            if wid is not None and wid not in used_word:
+                tags.append(model.config.id2label[pid])
+                scores.append(score)
+                used_word.add(wid)
             
-    return tokens, tags, scores
+        return tokens, tags, scores
 
 def insert_markers(tokens, tags, scores):
     out = []
     tense = "base"
     token_set = set(t.lower() for t in tokens)
+    verb_types = RESOURCES.get("verb_types")
     
     # 1. Detect Tense from Context Keywords
     if any(w in token_set for w in FUTURE_KEYWORDS): tense = "future"
@@ -167,12 +164,12 @@ def insert_markers(tokens, tags, scores):
             out.append(tok)
             continue
 
-        is_candidate_verb = tok.lower() in VERB_TYPES
+        is_candidate_verb = tok.lower() in verb_types
         is_time_usage = (tok.lower() in TIME_ADVERBS) and tense != "base"
         
         # Handle Verbs
         if is_candidate_verb and not is_time_usage:
-            word_to_add = conjugate(tok.lower(), VERB_TYPES[tok.lower()], tense)
+            word_to_add = conjugate(tok.lower(), verb_types[tok.lower()], tense)
         else:
             word_to_add = tok
 
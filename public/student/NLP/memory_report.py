@@ -0,0 +1,236 @@
+"""
+Resident memory broken down by component: models, tokenizer state,
+lexicons and caches.
+
+    python memory_report.py                   # lexicons and caches (models stay unloaded)
+    python memory_report.py --load-models     # load every registered model first
+    python memory_report.py --load-models --check [memory_budget.json]
+                                              # exit 1 if RSS or a component is over budget
+
+The servers serve the same report at GET /memory to callers with
+X-Admin-Token matching UBIGKAS_ADMIN_TOKEN.
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import sys
+import types
+from collections import deque
+import numpy as np
+from model_registry import REGISTRY, model_size_bytes
+from resources import RESOURCES
+from tokenization import CachedTokenizer
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET_PATH = os.path.join(BASE_DIR, "memory_budget.json")
+
+MB = 2 ** 20
+GROUPS = ("models", "tokenizers", "lexicons", "caches")
+
+# Extra components (group, name, getter) registered by the servers
+_TRACKED = []
+
+def track(group, name, getter):
+    """Adds `getter()` to the report as `<group>/<name>`, e.g. a server's result cache."""
+    _TRACKED.append((group, name, getter))
+
+# ==========================================
+# 1. SIZE ESTIMATES
+# ==========================================
+_SKIP = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+         types.MethodType, types.CodeType)
+
+def deep_size(obj, seen=None):
+    """
+    Approximate bytes reachable from `obj`: containers, instance
+    attributes and numpy / torch buffers. Objects already in `seen` are not
+    counted again, so one `seen` across calls attributes shared data to
+    the first component that reaches it. Memory held outside Python (the
+    Rust side of fast tokenizers, allocator slack) is not visible here and
+    ends up as "unattributed" in the report.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _SKIP):
+            continue
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            # getsizeof includes the buffer when the array owns it (not for views)
+            total += sys.getsizeof(o, 0)
+            continue
+        if type(o).__module__.startswith("torch") and hasattr(o, "element_size"):
+            total += o.numel() * o.element_size()
+            continue
+        total += sys.getsizeof(o, 0)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        else:
+            attrs = vars(o) if hasattr(o, "__dict__") else None
+            if attrs is not None:
+                stack.append(attrs)
+            for slot in getattr(type(o), "__slots__", ()):
+                if hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+    return total
+
+def process_rss():
+    """(resident bytes, source); falls back to peak RSS where the current value is unavailable."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss, "psutil"
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024, "proc"
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return (peak if sys.platform == "darwin" else peak * 1024), "peak"
+    except ImportError:
+        return None, None
+
+# ==========================================
+# 2. REPORT
+# ==========================================
+def memory_report():
+    """Per-component sizes in MB, group totals, and how much of RSS they account for."""
+    seen = set()
+    components = {}
+
+    # Models first: parameters and buffers, then the tokenizer beside them
+    for name, value in sorted(REGISTRY.loaded().items()):
+        parts = value if isinstance(value, (tuple, list)) else (value,)
+        for part in parts:
+            if hasattr(part, "parameters"):
+                components[f"models/{name}"] = model_size_bytes(part)
+                seen.update(id(t) for t in part.parameters())
+                seen.update(id(t) for t in part.buffers())
+            elif part is not None:
+                if isinstance(part, CachedTokenizer):
+                    components[f"caches/encode:{name}"] = deep_size(part._encodings, seen)
+                components[f"tokenizers/{name}"] = deep_size(part, seen)
+
+    # Lexicons: one entry per resource, per field for tuple-shaped ones
+    for name, entry in sorted(RESOURCES.current().entries.items()):
+        value = entry.value
+        if hasattr(value, "_fields"):
+            for field in value._fields:
+                components[f"lexicons/{name}.{field}"] = deep_size(getattr(value, field), seen)
+        else:
+            components[f"lexicons/{name}"] = deep_size(value, seen)
+
+    for group, name, getter in _TRACKED:
+        try:
+            components[f"{group}/{name}"] = deep_size(getter(), seen)
+        except Exception as e:
+            logger.warning(f"Could not size {group}/{name}: {e}")
+
+    rss, rss_source = process_rss()
+    attributed = sum(components.values())
+    return {
+        "rss_mb": round(rss / MB, 1) if rss is not None else None,
+        "rss_source": rss_source,
+        "attributed_mb": round(attributed / MB, 1),
+        "unattributed_mb": round((rss - attributed) / MB, 1) if rss is not None else None,
+        "groups": {g: round(sum(b for k, b in components.items() if k.startswith(g + "/")) / MB, 1)
+                   for g in GROUPS},
+        "components": {k: round(b / MB, 2) for k, b in sorted(components.items())},
+        "models_registered": REGISTRY.names(),
+    }
+
+# ==========================================
+# 3. BUDGET CHECK
+# ==========================================
+def load_budget(path=DEFAULT_BUDGET_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def check_budget(report, budget):
+    """
+    Violations of `budget` ({"rss_mb": N, "components": {pattern: N}}), as
+    messages. Patterns are fnmatch globs over component names; only the
+    most specific matching pattern (most literal characters) applies, so
+    "lexicons/lexicon.*" overrides the catch-all "lexicons/*".
+    """
+    violations = []
+    if budget.get("rss_mb") and report["rss_mb"] is not None and report["rss_mb"] > budget["rss_mb"]:
+        violations.append(f"RSS {report['rss_mb']} MB > {budget['rss_mb']} MB")
+    patterns = budget.get("components", {})
+    for name, mb in report["components"].items():
+        matching = [p for p in patterns if fnmatch.fnmatchcase(name, p)]
+        if not matching:
+            continue
+        pattern = max(matching, key=lambda p: len(p) - sum(p.count(c) for c in "*?["))
+        if mb > patterns[pattern]:
+            violations.append(f"{name} {mb} MB > {patterns[pattern]} MB ({pattern})")
+    return violations
+
+def build_stack(load_models=False):
+    """Constructs the corrector and analyzer the way the servers do, registering every component."""
+    rules_dir = os.path.abspath(os.path.join(BASE_DIR, "..", "Sentence Recognition"))
+    if rules_dir not in sys.path:
+        sys.path.append(rules_dir)
+    from filipino_grammar_corrector import FilipinoGrammarCorrector
+    from dictionary_utils import DEFINITION_CACHE
+    import marker_roberta  # registers the tagger and verb types
+
+    corrector = FilipinoGrammarCorrector(
+        tl_en_model=os.path.join(BASE_DIR, "final_tl_en_translator"),
+        en_tl_model=os.path.join(BASE_DIR, "final_tagalog_translator"),
+        spelling_model_path=os.path.join(BASE_DIR, "my_spelling_model"),
+    )
+    track("caches", "definitions", lambda: DEFINITION_CACHE)
+    if load_models:
+        for name in REGISTRY.names():
+            REGISTRY.get(name)
+    return corrector
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory footprint of the UBigkas NLP stack")
+    parser.add_argument("--load-models", action="store_true", help="Load every registered model before measuring")
+    parser.add_argument("--check", nargs="?", const=DEFAULT_BUDGET_PATH, metavar="BUDGET_JSON",
+                        help="Exit 1 if RSS or any component exceeds the budget")
+    parser.add_argument("--json", action="store_true", help="Print the raw report")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    build_stack(load_models=args.load_models)
+    report = memory_report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, mb in report["components"].items():
+            print(f"{name:<60} {mb:>10.2f} MB")
+        print("-" * 73)
+        for group, mb in report["groups"].items():
+            print(f"{group:<60} {mb:>10.1f} MB")
+        print(f"{'attributed':<60} {report['attributed_mb']:>10.1f} MB")
+        if report["rss_mb"] is not None:
+            print(f"{'process RSS (' + report['rss_source'] + ')':<60} {report['rss_mb']:>10.1f} MB")
+            print(f"{'unattributed (interpreter, libraries, native buffers)':<60} {report['unattributed_mb']:>10.1f} MB")
+
+    if args.check:
+        violations = check_budget(report, load_budget(args.check))
+        for v in violations:
+            print(f"OVER BUDGET: {v}", file=sys.stderr)
+        if violations:
+            sys.exit(1)
+        print(f"Within budget ({args.check})")
+
+if __name__ == "__main__":
+    main()
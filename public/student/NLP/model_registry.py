@@ -0,0 +1,219 @@
+import gc
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from resources import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 1. SIZE ACCOUNTING
+# ==========================================
+def model_size_bytes(obj):
+    """Bytes held by the torch parameters and buffers in `obj` (tuples/lists/dicts are walked)."""
+    if isinstance(obj, dict):
+        return sum(model_size_bytes(v) for v in obj.values())
+    if isinstance(obj, (tuple, list)):
+        return sum(model_size_bytes(v) for v in obj)
+    total = 0
+    if hasattr(obj, "parameters"):
+        total += sum(p.numel() * p.element_size() for p in obj.parameters())
+    if hasattr(obj, "buffers"):
+        total += sum(b.numel() * b.element_size() for b in obj.buffers())
+    return total
+
+def checkpoint_fingerprint(path):
+    """
+    Content hash of a checkpoint, so retraining in place or a new Hub
+    revision changes it: every file (config, tokenizer, weights) of a
+    local directory, else the commit a Hub id resolves to. Without a
+    reachable Hub, the cached snapshot, then the id itself.
+    """
+    if os.path.isdir(path):
+        return file_fingerprint(sorted(os.path.join(root, name)
+                                       for root, _, names in os.walk(path) for name in names))
+    if os.path.isabs(path) or os.path.exists(path):
+        # A local file, or a missing directory (its loader falls back to a stock model)
+        return file_fingerprint([path])
+    try:
+        from huggingface_hub import HfApi
+        return HfApi().model_info(path).sha[:16]
+    except Exception as e:
+        logger.warning(f"Could not resolve the Hub revision of {path}: {e}")
+    try:
+        from huggingface_hub import snapshot_download
+        # Snapshot directories are named after the commit they hold
+        return os.path.basename(snapshot_download(path, local_files_only=True))[:16]
+    except Exception:
+        return path
+
+# ==========================================
+# 2. REGISTRY
+# ==========================================
+class _Entry:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.size = 0
+        self.loads = 0
+        self.active = 0
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+
+class ModelRegistry:
+    """
+    One shared instance of each model per process. A model is loaded by
+    its registered loader on first use, and unloaded again when it has
+    been idle for `idle_seconds` or when loading another one pushes the
+    total over `memory_budget_mb` (least recently used first). Models in
+    use inside `use()` are never unloaded; callers that kept a reference
+    from `get()` just hold the old instance until they drop it.
+    """
+
+    def __init__(self, memory_budget_mb=None, idle_seconds=None):
+        self.memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        self.idle_seconds = idle_seconds or None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def register(self, name, loader):
+        """Registers `loader` under `name`; the first registration wins so instances are shared."""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(name, loader)
+            return name
+
+    def is_loaded(self, name):
+        return self._entries[name].value is not None
+
+    def names(self):
+        return sorted(self._entries)
+
+    def fingerprint(self):
+        """Hash over every registered checkpoint's contents; names are "<kind>:<path or Hub id>"."""
+        parts = [f"{name}={checkpoint_fingerprint(name.split(':', 1)[1])}" for name in self.names()]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+    def loaded(self):
+        """{name: value} for the models currently loaded."""
+        return {e.name: e.value for e in list(self._entries.values()) if e.value is not None}
+
+    def get(self, name):
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.value is None:
+                started = time.perf_counter()
+                entry.value = entry.loader()
+                entry.size = model_size_bytes(entry.value)
+                entry.loads += 1
+                logger.info(f"Loaded model '{name}' ({entry.size / 2**20:.1f} MB) "
+                            f"in {time.perf_counter() - started:.1f}s")
+            entry.last_used = time.time()
+            value = entry.value
+        self._enforce_budget(keep=name)
+        self._start_reaper()
+        return value
+
+    @contextmanager
+    def use(self, name):
+        """Like get(), but pins the model so eviction skips it until the block ends."""
+        entry = self._entries[name]
+        with self._lock:
+            entry.active += 1
+        try:
+            yield self.get(name)
+        finally:
+            with self._lock:
+                entry.active -= 1
+                entry.last_used = time.time()
+
+    def unload(self, name, only_idle=False):
+        """Drops model `name`; with `only_idle`, not if a use() block has started on it since."""
+        entry = self._entries[name]
+        with entry.lock:
+            with self._lock:
+                if entry.value is None or (only_idle and entry.active):
+                    return False
+                entry.value = None
+                entry.size = 0
+        gc.collect()
+        logger.info(f"Unloaded model '{name}'")
+        return True
+
+    def loaded_bytes(self):
+        return sum(e.size for e in self._entries.values() if e.value is not None)
+
+    def _enforce_budget(self, keep=None):
+        if self.memory_budget is None:
+            return
+        while self.loaded_bytes() > self.memory_budget:
+            with self._lock:
+                idle = [e for e in self._entries.values()
+                        if e.value is not None and e.active == 0 and e.name != keep]
+            if not idle:
+                logger.warning(f"Model memory {self.loaded_bytes() / 2**20:.0f} MB is over budget "
+                               f"but every other model is in use")
+                return
+            self.unload(min(idle, key=lambda e: e.last_used).name, only_idle=True)
+
+    def evict_idle(self, now=None):
+        if self.idle_seconds is None:
+            return []
+        now = now or time.time()
+        with self._lock:
+            stale = [e.name for e in self._entries.values()
+                     if e.value is not None and e.active == 0 and now - e.last_used > self.idle_seconds]
+        return [name for name in stale if self.unload(name, only_idle=True)]
+
+    def _start_reaper(self):
+        if self.idle_seconds is None or self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            interval = max(1.0, min(60.0, self.idle_seconds / 2))
+
+            def _run():
+                while True:
+                    time.sleep(interval)
+                    self.evict_idle()
+
+            self._reaper = threading.Thread(target=_run, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def report(self):
+        """Per-model status and resident size, for logs and the /models endpoint."""
+        now = time.time()
+        models = {}
+        for name, e in sorted(self._entries.items()):
+            models[name] = {
+                "loaded": e.value is not None,
+                "size_mb": round(e.size / 2**20, 1),
+                "loads": e.loads,
+                "in_use": e.active,
+                "idle_seconds": round(now - e.last_used, 1) if e.last_used else None,
+            }
+        return {
+            "models": models,
+            "loaded_mb": round(self.loaded_bytes() / 2**20, 1),
+            "budget_mb": round(self.memory_budget / 2**20, 1) if self.memory_budget else None,
+            "idle_timeout_seconds": self.idle_seconds,
+        }
+
+def _env_float(name):
+    try:
+        return float(os.environ.get(name, 0)) or None
+    except ValueError:
+        return None
+
+# Process-wide registry: UBIGKAS_MODEL_MEMORY_MB caps resident model memory,
+# UBIGKAS_MODEL_IDLE_SECONDS unloads models nobody has used for that long.
+REGISTRY = ModelRegistry(
+    memory_budget_mb=_env_float("UBIGKAS_MODEL_MEMORY_MB"),
+    idle_seconds=_env_float("UBIGKAS_MODEL_IDLE_SECONDS"),
+)
@@ -0,0 +1,251 @@
+"""
+Compact n-gram context model for ranking spelling candidates.
+
+    python ngram_ranker.py build                 # default corpus -> ngram_model.npz
+    python ngram_ranker.py build extra.txt ...   # plus more text files / question banks
+    python ngram_ranker.py rank "Suot niya ang gnto" ganito ginto
+"""
+import argparse
+from array import array
+from bisect import bisect_left
+import json
+import logging
+import math
+import os
+import re
+import numpy as np
+from resources import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "ngram_model.npz")
+ASSESSMENT_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "assessment"))
+DEFAULT_CORPUS = [os.path.join(BASE_DIR, "context_corpus.txt")] + [
+    os.path.join(ASSESSMENT_DIR, name) for name in (
+        "sentence_structure.json", "affix_questions.json", "pronoun_questions.json",
+        "panguri_questions.json", "noun_questions.json", "adverb_questions.json",
+    )
+]
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+PUNCT = ".,!?;:\"'()-"
+
+# Counts are stored as uint8 log-buckets: q = round(log2(count + 1) * SCALE)
+QUANT_SCALE = 16
+DEQUANT = [2 ** (q / QUANT_SCALE) - 1 for q in range(256)]
+BACKOFF = 0.4        # stupid-backoff factor when a bigram was never seen
+COOC_WEIGHT = 0.5    # weight of same-sentence co-occurrence evidence
+COOC_WINDOW = 6
+
+def quantize(counts):
+    return np.minimum(np.round(np.log2(np.asarray(counts, dtype=np.float64) + 1) * QUANT_SCALE), 255).astype(np.uint8)
+
+# ==========================================
+# 1. CORPUS
+# ==========================================
+def read_corpus(paths=DEFAULT_CORPUS):
+    """Sentences from text files (one per line, # comments) and quiz question banks."""
+    sentences = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        if path.endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                for q in json.load(f):
+                    wrong, word, answer = q.get("wrongSentence"), q.get("wrongWord"), q.get("correctOption")
+                    if not isinstance(answer, str):
+                        continue
+                    if " " in answer.strip():
+                        sentences.append(answer)
+                    elif isinstance(wrong, str) and isinstance(word, str) and word in wrong:
+                        # Single-word answers: put the fix back into the sentence
+                        sentences.append(wrong.replace(word, answer, 1))
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                sentences.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return sentences
+
+# ==========================================
+# 2. MODEL
+# ==========================================
+class NgramRanker:
+    """
+    Unigram, bigram and windowed co-occurrence counts over a fixed
+    vocabulary. Pairs are packed into sorted uint64 keys (id_a << 32 | id_b)
+    next to uint8 quantized counts, so a lookup is one binary search. The
+    numpy arrays are what gets saved; lookups run on flat array/bytes views
+    of them, which avoids numpy's per-call overhead on scalar queries.
+    """
+
+    def __init__(self, vocab, unigram_q, bigram_keys, bigram_q, cooc_keys, cooc_q, total, corpus=None):
+        self.vocab = list(vocab)
+        self.ids = {w: i for i, w in enumerate(self.vocab)}
+        self.unigram_q = unigram_q
+        self.bigram_keys = bigram_keys
+        self.bigram_q = bigram_q
+        self.cooc_keys = cooc_keys
+        self.cooc_q = cooc_q
+        self.total = float(total)
+        # Fingerprint of the corpus files the counts came from
+        self.corpus = corpus
+        self._unigram_q = bytes(np.asarray(unigram_q, dtype=np.uint8))
+        self._bigrams = (array("Q", np.asarray(bigram_keys, dtype=np.uint64).tobytes()),
+                         bytes(np.asarray(bigram_q, dtype=np.uint8)))
+        self._cooc = (array("Q", np.asarray(cooc_keys, dtype=np.uint64).tobytes()),
+                      bytes(np.asarray(cooc_q, dtype=np.uint8)))
+
+    @classmethod
+    def build(cls, sentences, window=COOC_WINDOW, corpus=None):
+        docs = [WORD_RE.findall(s.lower()) for s in sentences]
+        vocab = sorted({w for doc in docs for w in doc})
+        ids = {w: i for i, w in enumerate(vocab)}
+
+        unigrams = np.zeros(len(vocab), dtype=np.int64)
+        bigrams, cooc = {}, {}
+        for doc in docs:
+            seq = [ids[w] for w in doc]
+            for i, a in enumerate(seq):
+                unigrams[a] += 1
+                if i + 1 < len(seq):
+                    key = (a << 32) | seq[i + 1]
+                    bigrams[key] = bigrams.get(key, 0) + 1
+                for b in seq[i + 1:i + 1 + window]:
+                    if a != b:
+                        key = (min(a, b) << 32) | max(a, b)
+                        cooc[key] = cooc.get(key, 0) + 1
+
+        def packed(pairs):
+            keys = np.array(sorted(pairs), dtype=np.uint64)
+            return keys, quantize([pairs[int(k)] for k in keys])
+
+        bigram_keys, bigram_q = packed(bigrams)
+        cooc_keys, cooc_q = packed(cooc)
+        return cls(vocab, quantize(unigrams), bigram_keys, bigram_q, cooc_keys, cooc_q, unigrams.sum(), corpus)
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path, vocab=np.array(self.vocab), unigram_q=self.unigram_q,
+            bigram_keys=self.bigram_keys, bigram_q=self.bigram_q,
+            cooc_keys=self.cooc_keys, cooc_q=self.cooc_q, total=np.array([self.total]),
+            corpus=np.array([self.corpus or ""]),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        data = np.load(path)
+        return cls(data["vocab"].tolist(), data["unigram_q"], data["bigram_keys"], data["bigram_q"],
+                   data["cooc_keys"], data["cooc_q"], data["total"][0], saved_corpus(path))
+
+    # --- Lookups ---
+    def _pair(self, table, a, b):
+        keys, qvals = table
+        key = (a << 32) | b
+        i = bisect_left(keys, key)
+        return DEQUANT[qvals[i]] if i < len(keys) and keys[i] == key else 0.0
+
+    def _unigram(self, wid):
+        return DEQUANT[self._unigram_q[wid]] if wid is not None else 0.0
+
+    def _p_unigram(self, wid):
+        return (self._unigram(wid) + 1) / (self.total + len(self.vocab))
+
+    def _id(self, word):
+        return self.ids.get(word.lower().strip(PUNCT)) if word else None
+
+    def _evidence(self, cid, lid, rid, context_ids):
+        """
+        How much the neighbours and nearby words favour `cid` beyond its
+        plain frequency: bigram PMI with the left/right neighbour (BACKOFF
+        when never seen together) plus positive co-occurrence PMI.
+        """
+        evidence = 0.0
+        if lid is not None:
+            count = self._pair(self._bigrams, lid, cid) if cid is not None else 0.0
+            evidence += math.log(count / self._unigram(lid) / self._p_unigram(cid)) if count else math.log(BACKOFF)
+        if rid is not None:
+            count = self._pair(self._bigrams, cid, rid) if cid is not None else 0.0
+            evidence += math.log(count / self._unigram(cid) / self._p_unigram(rid)) if count else math.log(BACKOFF)
+        if cid is not None:
+            for wid in context_ids:
+                if wid != cid:
+                    count = self._pair(self._cooc, min(cid, wid), max(cid, wid))
+                    if count:
+                        pmi = math.log(count * self.total / (self._unigram(cid) * self._unigram(wid)))
+                        evidence += COOC_WEIGHT * max(pmi, 0.0)
+        return evidence
+
+    def _context_ids(self, context):
+        return {wid for wid in map(self._id, context) if wid is not None}
+
+    def score(self, candidate, left=None, right=None, context=()):
+        """Log-score of `candidate` between `left` and `right` with `context` words nearby."""
+        cid = self._id(candidate)
+        return math.log(self._p_unigram(cid)) + self._evidence(
+            cid, self._id(left), self._id(right), self._context_ids(context))
+
+    def rank(self, candidates, left=None, right=None, context=()):
+        """
+        (best candidate, margin over the runner-up in log space). Candidates
+        are compared on context evidence only, so with no evidence the
+        incoming (edit-distance) order stands and the margin is 0.
+        """
+        if not candidates:
+            return None, 0.0
+        if len(candidates) == 1:
+            return candidates[0], float("inf")
+        lid, rid, context_ids = self._id(left), self._id(right), self._context_ids(context)
+        # Stable sort: ties keep the incoming order
+        scored = sorted(((self._evidence(self._id(c), lid, rid, context_ids), c) for c in candidates),
+                        key=lambda t: -t[0])
+        return scored[0][1], scored[0][0] - scored[1][0]
+
+def saved_corpus(path=DEFAULT_MODEL_PATH):
+    """Corpus fingerprint stored in a saved model (None for models saved without one)."""
+    with np.load(path) as data:
+        if "corpus" not in data.files:
+            return None
+        return str(data["corpus"][0]) or None
+
+def load_default(corpus=DEFAULT_CORPUS, model_path=DEFAULT_MODEL_PATH):
+    """
+    The saved model if it was built from the current `corpus` files, else a
+    fresh build from them, so an edited corpus is never shadowed by a stale
+    model (`python ngram_ranker.py build` saves the rebuilt one).
+    """
+    fingerprint = file_fingerprint(corpus)
+    if os.path.exists(model_path):
+        if saved_corpus(model_path) == fingerprint:
+            return NgramRanker.load(model_path)
+        logger.warning(f"{model_path} was built from another corpus; rebuilding from the corpus files")
+    return NgramRanker.build(read_corpus(corpus), corpus=fingerprint)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the n-gram context ranker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("extra", nargs="*", help="More corpus files (.txt or question-bank .json)")
+    build.add_argument("--out", default=DEFAULT_MODEL_PATH)
+    rank = sub.add_parser("rank")
+    rank.add_argument("sentence", help="Sentence containing the misspelled word")
+    rank.add_argument("candidates", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        sentences = read_corpus(DEFAULT_CORPUS + args.extra)
+        # Only the default corpus is checked on load; extra files stay baked in until it changes
+        model = NgramRanker.build(sentences, corpus=file_fingerprint(DEFAULT_CORPUS))
+        model.save(args.out)
+        print(f"Saved {len(model.vocab)} words, {len(model.bigram_keys)} bigrams, "
+              f"{len(model.cooc_keys)} co-occurrences from {len(sentences)} sentences to {args.out}")
+    else:
+        model = load_default()
+        words = WORD_RE.findall(args.sentence)
+        for c in args.candidates:
+            print(f"{c}: {model.score(c, context=words):.3f}")
+        print("best:", model.rank(args.candidates, context=words))
+
+if __name__ == "__main__":
+    main()
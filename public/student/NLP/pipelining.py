@@ -0,0 +1,112 @@
+import contextvars
+import logging
+import os
+import queue
+import threading
+from profiling import PER_THREAD_PROFILING, current_trace
+
+logger = logging.getLogger(__name__)
+
+# Items allowed to wait between two stages; keeps a fast stage from running
+# far ahead of a slow one (and its work from being wasted on an error).
+# 0 runs the stages one item at a time on the calling thread.
+PIPELINE_DEPTH = int(os.environ.get("UBIGKAS_PIPELINE_DEPTH", 2))
+
+_DONE = object()
+
+class _Failed:
+    """Stands in for an item whose stage raised; later stages pass it through."""
+
+    def __init__(self, error):
+        self.error = error
+
+def run_pipeline(items, stages, depth=PIPELINE_DEPTH):
+    """
+    Runs every item through `stages` (a list of (name, fn) where
+    fn(item) returns the item for the next stage) with one thread per
+    stage and bounded queues in between, so item n+1 can be in stage 1
+    while item n is in stage 2. Each stage handles items in order, so
+    results come back in input order, the same as calling the stages one
+    after another per item. Threads run in copies of the caller's context
+    (lane, pinned resources, trace), and a profiled request's trace covers
+    the stage threads too. The first exception is re-raised once all
+    threads have stopped; no new items are started after it.
+    """
+    items = list(items)
+    trace = current_trace()
+    if trace is not None and not PER_THREAD_PROFILING:
+        # The stage threads could only be sampled, not cProfiled; keep the trace complete
+        depth = 0
+    if depth <= 0 or len(items) < 2 or len(stages) < 2:
+        results = []
+        for item in items:
+            for _, fn in stages:
+                item = fn(item)
+            results.append(item)
+        return results
+
+    queues = [queue.Queue(maxsize=depth) for _ in range(len(stages) + 1)]
+    failed = threading.Event()
+
+    def _worker(fn, inbox, outbox):
+        if trace is None:
+            return _work(fn, inbox, outbox)
+        try:
+            attached = trace.attach_thread()
+            attached.__enter__()
+        except Exception as e:
+            # Never let profiling stall the pipeline; run the stage untraced
+            logger.warning(f"Could not trace pipeline thread: {e}")
+            return _work(fn, inbox, outbox)
+        try:
+            return _work(fn, inbox, outbox)
+        finally:
+            attached.__exit__(None, None, None)
+
+    def _work(fn, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                outbox.put(_DONE)
+                return
+            if failed.is_set() and not isinstance(item, _Failed):
+                # Already going to raise; the rest of the items are not needed
+                continue
+            if not isinstance(item, _Failed):
+                try:
+                    item = fn(item)
+                except BaseException as e:
+                    failed.set()
+                    item = _Failed(e)
+            outbox.put(item)
+
+    def _feed():
+        for item in items:
+            if failed.is_set():
+                break
+            queues[0].put(item)
+        queues[0].put(_DONE)
+
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(_feed,),
+                                name="pipeline-feed", daemon=True)]
+    for i, (name, fn) in enumerate(stages):
+        threads.append(threading.Thread(target=contextvars.copy_context().run,
+                                        args=(_worker, fn, queues[i], queues[i + 1]),
+                                        name=f"pipeline-{name}", daemon=True))
+    for thread in threads:
+        thread.start()
+
+    results, error = [], None
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            break
+        if isinstance(item, _Failed):
+            error = error or item.error
+        else:
+            results.append(item)
+    for thread in threads:
+        thread.join()
+    if error is not None:
+        raise error
+    return results
@@ -0,0 +1,230 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Where traces are written: <trace_id>.prof (cProfile / snakeviz),
+# <trace_id>.folded (flamegraph.pl / speedscope) and <trace_id>.json (summary)
+PROFILE_DIR = os.environ.get(
+    "UBIGKAS_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_HEADER = "X-Profile-Token"
+TRACE_HEADER = "X-Trace-Id"
+
+_current = ContextVar("ubigkas_trace", default=None)
+# cProfile can only have one active profiler per process on newer Pythons
+_profile_lock = threading.Lock()
+# Before 3.12 each thread can run its own profiler next to the request's
+PER_THREAD_PROFILING = sys.version_info < (3, 12)
+
+def current_trace():
+    """The Trace of the request being profiled on this thread, or None."""
+    return _current.get()
+
+# ==========================================
+# 1. STACK SAMPLER (folded output)
+# ==========================================
+class StackSampler:
+    """
+    Samples the Python stacks of the request thread, plus any helper
+    threads added while it runs, every `interval` seconds into
+    folded-stack counts. Helper stacks are rooted at their thread name.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._threads = {thread_id: None}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def add_thread(self, thread_id, name):
+        threads = dict(self._threads)
+        threads[thread_id] = name
+        self._threads = threads
+
+    def remove_thread(self, thread_id):
+        self._threads = {t: n for t, n in self._threads.items() if t != thread_id}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, name in self._threads.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    if name:
+                        stack.append(f"[{name}]")
+                    self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+# ==========================================
+# 2. TRACE
+# ==========================================
+class Trace:
+    """cProfile + stack samples + per-stage timings for one request."""
+
+    def __init__(self, name, interval=0.005):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.stages = []
+        self.elapsed = None
+        self._profile = cProfile.Profile()
+        self._thread_profiles = []
+        self._sampler = StackSampler(threading.get_ident(), interval)
+        self._token = None
+
+    def start(self):
+        self._token = _current.set(self)
+        self._started = time.perf_counter()
+        self._sampler.start()
+        try:
+            self._profile.enable()
+        except Exception:
+            # e.g. another profiler is already active; leave nothing running
+            self._sampler.stop()
+            _current.reset(self._token)
+            raise
+
+    def stop(self):
+        self._profile.disable()
+        self._sampler.stop()
+        self.elapsed = time.perf_counter() - self._started
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            _current.set(None)
+
+    def record_stage(self, stage, seconds):
+        self.stages.append({"stage": stage, "ms": round(seconds * 1000, 2)})
+
+    @contextmanager
+    def attach_thread(self):
+        """
+        Profiles the calling helper thread (e.g. a pipeline stage worker)
+        as part of this trace: its stack is sampled and, where the
+        interpreter allows (PER_THREAD_PROFILING), it gets its own cProfile
+        that save() merges into the request's.
+        """
+        thread = threading.current_thread()
+        self._sampler.add_thread(thread.ident, thread.name)
+        profile = cProfile.Profile() if PER_THREAD_PROFILING else None
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._thread_profiles.append(profile)
+            self._sampler.remove_thread(thread.ident)
+
+    def save(self, directory=PROFILE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.trace_id)
+        stats = pstats.Stats(self._profile)
+        for profile in self._thread_profiles:
+            stats.add(profile)
+        stats.dump_stats(base + ".prof")
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            f.write(self._sampler.folded())
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({
+                "trace_id": self.trace_id,
+                "request": self.name,
+                "elapsed_ms": round(self.elapsed * 1000, 2),
+                "stages": self.stages,
+                "samples": sum(self._sampler.counts.values()),
+            }, f, indent=2)
+        return base
+
+# ==========================================
+# 3. FLASK INTEGRATION
+# ==========================================
+def install_profiling(app):
+    """
+    Profiles a request when it carries X-Profile-Token matching
+    UBIGKAS_PROFILE_TOKEN, or at random with probability
+    UBIGKAS_PROFILE_SAMPLE_RATE. With neither set no hooks are installed,
+    so normal requests pay nothing. Profiled responses carry X-Trace-Id.
+    """
+    token = os.environ.get("UBIGKAS_PROFILE_TOKEN")
+    rate = float(os.environ.get("UBIGKAS_PROFILE_SAMPLE_RATE", 0) or 0)
+    interval = float(os.environ.get("UBIGKAS_PROFILE_INTERVAL_MS", 5)) / 1000.0
+    if not token and rate <= 0:
+        return False
+
+    from flask import g, request
+
+    def _wanted():
+        header = request.headers.get(PROFILE_HEADER)
+        if token and header and hmac.compare_digest(header, token):
+            return True
+        return rate > 0 and random.random() < rate
+
+    def _finish(trace):
+        trace.stop()
+        _profile_lock.release()
+        try:
+            path = trace.save()
+            logger.info(f"Profiled {trace.name} in {trace.elapsed * 1000:.1f} ms -> {path}.*")
+        except OSError as e:
+            logger.error(f"Could not save trace {trace.trace_id}: {e}")
+
+    @app.before_request
+    def _start_trace():
+        # Concurrent requests are not profiled while another trace is running
+        if not _wanted() or not _profile_lock.acquire(blocking=False):
+            return
+        try:
+            trace = Trace(f"{request.method} {request.path}", interval)
+            trace.start()
+        except Exception as e:
+            # No hook would release the lock for a trace that never started
+            _profile_lock.release()
+            logger.error(f"Could not start trace: {e}")
+            return
+        g.ubigkas_trace = trace
+
+    @app.after_request
+    def _end_trace(response):
+        trace = g.pop("ubigkas_trace", None)
+        if trace is not None:
+            _finish(trace)
+            response.headers[TRACE_HEADER] = trace.trace_id
+        return response
+
+    @app.teardown_request
+    def _abort_trace(exc):
+        # after_request is skipped on unhandled errors
+        trace = g.pop("ubigkas_trace", None)
+        if trace is not None:
+            _finish(trace)
+
+    logger.info(f"Request profiling enabled (sample rate {rate}, token {'set' if token else 'unset'})")
+    return True
@@ -0,0 +1,312 @@
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+ADMIN_HEADER = "X-Admin-Token"
+
+_pinned = ContextVar("ubigkas_resources", default=None)
+
+def file_fingerprint(paths):
+    """Content hash over `paths`; missing files are skipped, so creating one changes it."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def _stamp(paths):
+    # Cheap change check for the file watcher; content is only hashed when this moves
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+# ==========================================
+# 1. BUNDLES
+# ==========================================
+class _Loaded:
+    def __init__(self, name, paths, value, fingerprint, stamp, load_seconds):
+        self.name = name
+        self.paths = paths
+        self.value = value
+        self.fingerprint = fingerprint
+        self.stamp = stamp
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+class ResourceBundle:
+    """
+    One immutable set of loaded resources. A reload builds a new bundle
+    next to the live one; unchanged resources are shared between the two.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.version = hashlib.sha256("\x1f".join(
+            f"{name}={entries[name].fingerprint}" for name in sorted(entries)
+        ).encode("utf-8")).hexdigest()[:16]
+        self.created = time.time()
+
+    def __getitem__(self, name):
+        return self.entries[name].value
+
+    def __contains__(self, name):
+        return name in self.entries
+
+# ==========================================
+# 2. MANAGER
+# ==========================================
+class ResourceManager:
+    """
+    Lexicon and rule data that can be reloaded without restarting the
+    process. Each resource is a loader over a list of files; reload()
+    rebuilds the resources whose files changed into a new bundle and swaps
+    it in with one assignment. Code reads resources through get(), which
+    returns the bundle pinned for the current request (see pinned()), so a
+    request that started before a swap finishes on the version it began
+    with. on_swap() callbacks invalidate caches derived from the old data.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._bundle = ResourceBundle({})
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self._watcher = None
+        self.history = deque(maxlen=20)
+
+    def _load(self, name, paths, loader):
+        started = time.perf_counter()
+        stamp = _stamp(paths)
+        fingerprint = file_fingerprint(paths)
+        value = loader(*paths)
+        return _Loaded(name, paths, value, fingerprint, stamp, time.perf_counter() - started)
+
+    def register(self, name, paths, loader):
+        """
+        Loads `loader(*paths)` as `name` and adds it to the live bundle. The
+        first registration wins, so modules can register from __init__.
+        """
+        with self._reload_lock:
+            if name in self._specs:
+                return
+            paths = list(paths)
+            entry = self._load(name, paths, loader)
+            self._specs[name] = (paths, loader)
+            self._bundle = ResourceBundle(dict(self._bundle.entries, **{name: entry}))
+
+    def current(self):
+        """The bundle pinned for this request, else the live one."""
+        return _pinned.get() or self._bundle
+
+    def get(self, name):
+        return self.current()[name]
+
+    def fingerprint(self, name):
+        """Content hash of resource `name`'s files in the current bundle."""
+        return self.current().entries[name].fingerprint
+
+    @property
+    def version(self):
+        return self.current().version
+
+    @contextmanager
+    def pinned(self):
+        """Pins the live bundle for the block; nested pins keep the outer one."""
+        if _pinned.get() is not None:
+            yield _pinned.get()
+            return
+        token = _pinned.set(self._bundle)
+        try:
+            yield self._bundle
+        finally:
+            _pinned.reset(token)
+
+    def on_swap(self, callback):
+        """callback(old_bundle, new_bundle, changed_names) runs after every swap."""
+        self._listeners.append(callback)
+        return callback
+
+    def reload(self, force=False):
+        """
+        Rebuilds resources whose files changed (every resource with `force`)
+        and swaps the new bundle in. Returns (bundle, changed names). If a
+        loader raises, nothing is swapped and the exception propagates.
+        """
+        with self._reload_lock:
+            old = self._bundle
+            entries = dict(old.entries)
+            changed = []
+            for name, (paths, loader) in self._specs.items():
+                if force or file_fingerprint(paths) != old.entries[name].fingerprint:
+                    entries[name] = self._load(name, paths, loader)
+                    changed.append(name)
+                elif _stamp(paths) != old.entries[name].stamp:
+                    # Touched but identical; remember the new stamp so the watcher settles
+                    entries[name].stamp = _stamp(paths)
+            if not changed:
+                return old, []
+            new = ResourceBundle(entries)
+            self._bundle = new
+            self.history.append({"version": new.version, "previous": old.version,
+                                 "changed": changed, "at": new.created})
+
+        logger.info(f"Resources {old.version} -> {new.version} (reloaded: {', '.join(changed)})")
+        for callback in self._listeners:
+            try:
+                callback(old, new, changed)
+            except Exception as e:
+                logger.error(f"Resource swap listener {callback.__name__} failed: {e}")
+        return new, changed
+
+    def stale(self):
+        """Names whose files look modified since they were loaded (mtime/size only)."""
+        bundle = self._bundle
+        return [name for name, (paths, _) in self._specs.items()
+                if _stamp(paths) != bundle.entries[name].stamp]
+
+    def watch(self, interval):
+        """Polls the resource files every `interval` seconds and reloads on change."""
+        if self._watcher is not None:
+            return
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                if not self.stale():
+                    continue
+                try:
+                    self.reload()
+                except Exception as e:
+                    # Half-saved files fail to parse; the next poll tries again
+                    logger.error(f"Resource reload failed, keeping {self._bundle.version}: {e}")
+
+        self._watcher = threading.Thread(target=_run, name="resource-watcher", daemon=True)
+        self._watcher.start()
+
+    def report(self):
+        bundle = self.current()
+        return {
+            "version": bundle.version,
+            "live_version": self._bundle.version,
+            "created": bundle.created,
+            "resources": {
+                name: {
+                    "files": [os.path.basename(p) for p in e.paths],
+                    "fingerprint": e.fingerprint,
+                    "loaded_at": e.loaded_at,
+                    "load_ms": round(e.load_seconds * 1000, 1),
+                } for name, e in sorted(bundle.entries.items())
+            },
+            "history": list(self.history),
+        }
+
+class CurrentResource:
+    """
+    Stand-in for a module-level object that now lives in the resource
+    bundle: attribute and item access go to `field` of resource `name` in
+    the current bundle, so `from module import X` keeps working.
+    """
+
+    def __init__(self, manager, name, field=None):
+        self._manager = manager
+        self._name = name
+        self._field = field
+
+    def _target(self):
+        value = self._manager.get(self._name)
+        return getattr(value, self._field) if self._field else value
+
+    def __getattr__(self, attr):
+        return getattr(self._target(), attr)
+
+    def __getitem__(self, key):
+        return self._target()[key]
+
+    def __contains__(self, key):
+        return key in self._target()
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __len__(self):
+        return len(self._target())
+
+# Process-wide resources shared by the processor, marker and dictionary modules
+RESOURCES = ResourceManager()
+
+# ==========================================
+# 3. FLASK INTEGRATION
+# ==========================================
+def is_admin(request):
+    """True if the request's X-Admin-Token matches UBIGKAS_ADMIN_TOKEN; never without the variable."""
+    token = os.environ.get("UBIGKAS_ADMIN_TOKEN")
+    header = request.headers.get(ADMIN_HEADER)
+    return bool(token and header and hmac.compare_digest(header, token))
+
+def install_resource_reload(app, manager=RESOURCES):
+    """
+    Pins the live bundle for every request, serves GET /resources, and
+    POST /resources/reload ({"force": true} rebuilds everything) for
+    callers with X-Admin-Token matching UBIGKAS_ADMIN_TOKEN; without the
+    variable the reload endpoint is disabled. UBIGKAS_RESOURCE_WATCH_SECONDS
+    also reloads whenever the files change on disk.
+    """
+    from flask import g, jsonify, request
+
+    @app.before_request
+    def _pin_resources():
+        g.ubigkas_resources = _pinned.set(manager._bundle)
+
+    @app.teardown_request
+    def _unpin_resources(exc):
+        pin = g.pop("ubigkas_resources", None)
+        if pin is not None:
+            _pinned.reset(pin)
+
+    def resource_status():
+        return jsonify(manager.report())
+
+    def reload_resources():
+        if not is_admin(request):
+            return jsonify({"error": "Forbidden"}), 403
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        previous = manager._bundle.version
+        started = time.perf_counter()
+        try:
+            bundle, changed = manager.reload(force=bool(data.get("force")))
+        except Exception as e:
+            logger.error(f"Resource reload failed, keeping {previous}: {e}", exc_info=True)
+            return jsonify({"error": f"Reload failed: {e}", "version": previous}), 500
+        return jsonify({
+            "version": bundle.version,
+            "previous": previous,
+            "changed": changed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    app.add_url_rule("/resources", "resource_status", resource_status, methods=["GET"])
+    app.add_url_rule("/resources/reload", "reload_resources", reload_resources, methods=["POST"])
+
+    interval = float(os.environ.get("UBIGKAS_RESOURCE_WATCH_SECONDS", 0) or 0)
+    if interval > 0:
+        manager.watch(interval)
+        logger.info(f"Watching resource files every {interval:g}s")
@@ -4,6 +4,7 @@ import re
 import sys
 import os
 import logging
+import argparse
 
 # Configure logging so Flask logs and the corrector logs show up together
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,9 +26,18 @@ logger.info(f"NLP Path set to: {nlp_path}")
 try:
     # Import the new class from the updated file in ../NLP/
     from filipino_grammar_corrector import FilipinoGrammarCorrector
+    from serving import (ServerBusy, install_error_handlers, install_priority_lanes,
+                         request_budget_ms, serve)
+    from profiling import install_profiling
+    from traffic_capture import install_traffic_capture
+    from model_registry import REGISTRY
+    from http_cache import (sentence_etag, request_json, request_sentence, is_not_modified, cacheable,
+                            not_modified, fingerprint_values, normalize_sentence)
+    from resources import RESOURCES, install_resource_reload, is_admin
+    import memory_report
+    from sessions import SessionStore, correct_in_session
     # Assuming these still exist in ../NLP/ for the /analyze route
-    from filipino_rules import analyze_word, detect_sentence_structure
-    from dictionary_utils import get_meaning_and_type
+    from filipino_rules import SentenceAnalysis, analyze_correction
 except ImportError as e:
     logger.critical(f"Failed to import NLP modules from {nlp_path}. Error: {e}")
     sys.exit(1)
@@ -35,6 +45,11 @@ except ImportError as e:
 
 app = Flask(__name__)
 CORS(app)  # Allow frontend to access this server
+install_error_handlers(app)  # ServerBusy -> 503 + Retry-After
+install_priority_lanes(app)  # X-Priority: bulk queues behind interactive requests
+install_profiling(app)  # opt-in: UBIGKAS_PROFILE_TOKEN / UBIGKAS_PROFILE_SAMPLE_RATE
+install_resource_reload(app)  # lexicon reloads: POST /resources/reload with UBIGKAS_ADMIN_TOKEN
+install_traffic_capture(app)  # opt-in: UBIGKAS_CAPTURE_SAMPLE_RATE, replay with traffic_replay.py
 
 # --- Initialize AI Models ---
 logger.info("Initializing New Transformer-Based Filipino Grammar Corrector...")
@@ -49,90 +64,233 @@ try:
     corrector = FilipinoGrammarCorrector(
         tl_en_model=tl_en_model_path,
         en_tl_model=en_tl_model_path,
-        spelling_model_path=spelling_model_path
+        spelling_model_path=spelling_model_path,
+        # Server-wide latency SLO for /correct; requests may pass their own budget_ms
+        default_budget_ms=float(os.environ.get("UBIGKAS_CORRECT_BUDGET_MS", 0)) or None
     )
-    logger.info("AI Models loaded successfully! Server is ready.")
+    logger.info("AI Models registered (loaded on first use). Server is ready.")
 except Exception as e:
     logger.critical(f"Failed to initialize AI models. Server cannot start. Error: {e}")
     sys.exit(1)
 
+# --- Response cache keys ---
+# Anything that can change an answer goes into the ETag: the build, the model
+# checkpoints and the lexicon/rule files (RESOURCES.version, which changes on reload).
+BUILD_VERSION = os.environ.get("UBIGKAS_BUILD", "dev")
+# Checkpoint contents, not paths, so a retrained model or new Hub revision changes it
+MODEL_VERSION = fingerprint_values(BUILD_VERSION, REGISTRY.fingerprint())
+logger.info(f"Model version {MODEL_VERSION}")
 
-@app.route("/analyze", methods=["POST"])
+
+@app.route("/analyze", methods=["GET", "POST"])
 def analyze_sentence():
     """
     Analyzes sentence structure and word types using rule-based logic.
-    (This route remains unchanged based on your provided server code).
+    GET ?sentence=... is cacheable and honours If-None-Match.
     """
-    data = request.get_json()
-    sentence = data.get("sentence", "").strip()
+    sentence = request_sentence()
     if not sentence:
         return jsonify({"error": "No sentence provided"}), 400
 
+    etag = sentence_etag("analyze", sentence, BUILD_VERSION, RESOURCES.version)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
     # --- Pre-check for simple dictionary corrections ---
-    words = re.findall(r"\b[\w-]+\b", sentence)
-    suggested_corrections = []
-    
-    for word in words:
-        # Check dictionary utils for basic corrections
-        meaning, word_type, suggested_word, corrected, affix, affix_explanation = get_meaning_and_type(word)
-        if corrected and suggested_word != word:
-            suggested_corrections.append((word, suggested_word))
+    # One lookup table serves the raw and corrected passes, so each word is resolved once
+    resolved = {}
+    original = SentenceAnalysis(sentence, resolved)
 
     # Apply dictionary-based fixes first
-    corrected_words = [sugg if corrected and sugg != word else word for word, sugg in suggested_corrections]
+    corrected_words = original.corrected_words()
     corrected_sentence_base = " ".join(corrected_words) if corrected_words else sentence
 
+    analysis = SentenceAnalysis(corrected_sentence_base, resolved)
+
     # --- Analyze sentence structure ---
     try:
-        structure = detect_sentence_structure(corrected_sentence_base)
+        structure = analysis.structure
     except Exception as e:
         logger.error(f"Error during structure detection: {e}")
         structure = "Analysis Failed"
     
     # --- Analyze individual words ---
-    word_details = []
-    for word in corrected_sentence_base.split():
-        info = analyze_word(word)
-        word_details.append(info)
+    word_details = analysis.word_details()
 
-    return jsonify({
+    return cacheable(jsonify({
         "original": sentence,
         "corrected_base": corrected_sentence_base,
         "structure": structure,
         "words": word_details
-    })
+    }), etag)
 
-@app.route("/correct", methods=["POST"])
+@app.route("/correct", methods=["GET", "POST"])
 def correct_sentence():
     """
     Uses the new AI pipeline (UBigkas + RoBERTa + MarianMT) to correct grammar.
+    GET ?sentence=... is cacheable and honours If-None-Match.
     """
-    data = request.get_json()
-    sentence = data.get("sentence", "").strip()
+    sentence = request_sentence()
     
     if not sentence:
         return jsonify({"error": "No sentence provided"}), 400
 
+    etag = sentence_etag("correct", sentence, MODEL_VERSION, RESOURCES.version)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
     logger.info(f"Processing correction request length: {len(sentence)}")
 
     try:
         # Run the new full AI pipeline.
         # NOTE: The intermediate steps (cleaned, tagged, bridge) will be printed 
         # to the server console logs by the corrector class itself.
-        corrected_text = corrector.correct_grammar_with_pipeline(sentence)
+        report = corrector.correct_with_report(sentence, budget_ms=request_budget_ms())
         
-        # The new pipeline method only returns the final string.
-        # We update the JSON response to match available data.
-        return jsonify({
+        response = jsonify({
             "original": sentence,
-            "corrected": corrected_text
+            "corrected": report["corrected"],
+            "degradation": report["degradation"],
+            "elapsed_ms": report["elapsed_ms"],
+            "edits": report["edits"]
         })
+        # Only full-quality answers may be reused by caches
+        if report["degradation"] != "full":
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        return cacheable(response, etag)
         
+    except ServerBusy:
+        raise
     except Exception as e:
         logger.error(f"Error processing sentence in AI pipeline: {e}", exc_info=True)
         return jsonify({"error": f"Internal Error: {str(e)}"}), 500
 
+# Last corrected draft per editing session (/correct/session)
+SESSIONS = SessionStore()
+memory_report.track("caches", "sessions", lambda: SESSIONS)
+
+@RESOURCES.on_swap
+def _drop_stale_sessions(old, new, changed):
+    # Stored sentence results were computed with the old lexicon
+    SESSIONS.clear()
+
+@app.route("/correct/session", methods=["POST"])
+def correct_session():
+    """
+    Session-aware correction for edited drafts: POST {"session_id", "text"}.
+    Sentences unchanged since the session's last call reuse their results.
+    """
+    data = request_json()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    text = data.get("text", data.get("sentence", ""))
+    text = normalize_sentence(text) if isinstance(text, str) else ""
+    if not text:
+        return jsonify({"error": "No sentence provided"}), 400
+    session_id = data.get("session_id")
+    if session_id is not None and (not isinstance(session_id, str) or not 0 < len(session_id) <= 64):
+        return jsonify({"error": "Invalid session_id"}), 400
+
+    try:
+        response = jsonify(correct_in_session(corrector, SESSIONS, session_id, text,
+                                              budget_ms=request_budget_ms()))
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    except ServerBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing session correction: {e}", exc_info=True)
+        return jsonify({"error": f"Internal Error: {str(e)}"}), 500
+
+@app.route("/correct/analyze", methods=["GET", "POST"])
+def correct_and_analyze():
+    """
+    /correct and /analyze in one pass: every pipeline stage, plus structure
+    and word analysis of the input, the spelling-corrected text and the
+    final output, all resolved from one word table. POST {"session_id",
+    "text"} reuses unchanged sentences like /correct/session.
+    """
+    data = request_json() if request.method == "POST" else {}
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    session_id = data.get("session_id")
+    if session_id is not None:
+        text = data.get("text", data.get("sentence", ""))
+        text = normalize_sentence(text) if isinstance(text, str) else ""
+        if not text:
+            return jsonify({"error": "No sentence provided"}), 400
+        if not isinstance(session_id, str) or not 0 < len(session_id) <= 64:
+            return jsonify({"error": "Invalid session_id"}), 400
+        try:
+            response = jsonify(correct_in_session(corrector, SESSIONS, session_id, text,
+                                                  budget_ms=request_budget_ms(), analyze=analyze_correction))
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        except ServerBusy:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing session correction: {e}", exc_info=True)
+            return jsonify({"error": f"Internal Error: {str(e)}"}), 500
+
+    sentence = request_sentence()
+    if not sentence:
+        return jsonify({"error": "No sentence provided"}), 400
+
+    etag = sentence_etag("correct_analyze", sentence, BUILD_VERSION, MODEL_VERSION, RESOURCES.version)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    try:
+        report = corrector.correct_with_report(sentence, budget_ms=request_budget_ms())
+        response = jsonify({
+            "original": sentence,
+            "corrected": report["corrected"],
+            "degradation": report["degradation"],
+            "elapsed_ms": report["elapsed_ms"],
+            "edits": report["edits"],
+            "sentences": [{"text": r["text"], "corrected": r["corrected"], "stages": r["stages"]}
+                          for r in report["sentences"]],
+            "analysis": analyze_correction(report)
+        })
+        if report["degradation"] != "full":
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        return cacheable(response, etag)
+    except ServerBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing sentence in AI pipeline: {e}", exc_info=True)
+        return jsonify({"error": f"Internal Error: {str(e)}"}), 500
+
+@app.route("/models", methods=["GET"])
+def model_status():
+    """Per-model load state and resident size; models load on first /correct."""
+    return jsonify(REGISTRY.report())
+
+@app.route("/memory", methods=["GET"])
+def memory_status():
+    """Resident memory by component (models, tokenizers, lexicons, caches); admin-only, see memory_report.py."""
+    if not is_admin(request):
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(memory_report.memory_report())
+
+@app.route("/stages", methods=["GET"])
+def stage_status():
+    """In-flight and queued requests per model stage and priority lane."""
+    return jsonify({name: limiter.stats() for name, limiter in corrector.stage_limits.items()})
+
 if __name__ == "__main__":
-    # Run on port 5000
-    # use_reloader=False is recommended when loading heavy models to prevent double-loading
-    app.run(debug=True, port=5000, use_reloader=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="UBigkas NLP server")
+    parser.add_argument("--production", action="store_true", help="Serve with waitress instead of the Flask dev server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.production:
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    else:
+        # Run on port 5000
+        # use_reloader=False is recommended when loading heavy models to prevent double-loading
+        app.run(debug=True, port=args.port, use_reloader=False)
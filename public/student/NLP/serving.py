@@ -0,0 +1,405 @@
+import logging
+import math
+import os
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 1. ADMISSION CONTROL PER MODEL STAGE
+# ==========================================
+class ServerBusy(Exception):
+    """Raised when a stage queue is full; maps to 503 + Retry-After."""
+
+    def __init__(self, stage, retry_after):
+        super().__init__(f"Stage '{stage}' is at capacity. Retry in {retry_after}s.")
+        self.stage = stage
+        self.retry_after = retry_after
+
+# Requests run in a lane; interactive student calls outrank bulk teacher jobs
+LANES = ("interactive", "bulk")
+DEFAULT_LANE = "interactive"
+_current_lane = ContextVar("ubigkas_lane", default=DEFAULT_LANE)
+
+def current_lane():
+    return _current_lane.get()
+
+@contextmanager
+def lane(name):
+    """Runs the block (and every stage slot it takes) in lane `name`."""
+    token = _current_lane.set(name if name in LANES else DEFAULT_LANE)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+class LanePolicy:
+    """
+    `weight` is the lane's share when lanes compete, `max_in_flight` caps
+    its slots per stage (None = all of them), and `max_waiting` /
+    `wait_timeout` bound its queue.
+    """
+
+    def __init__(self, name, weight=1.0, max_in_flight=None, max_waiting=8, wait_timeout=10.0):
+        self.name = name
+        self.weight = weight
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+
+def lane_policies(max_waiting=8, wait_timeout=10.0):
+    """
+    Lane settings from UBIGKAS_LANE_<LANE>_WEIGHT / _CONCURRENCY / _QUEUE /
+    _TIMEOUT. Interactive defaults to 4x the weight of bulk and to the
+    stage's own queue limits; bulk gets a deeper, more patient queue.
+    """
+    defaults = {
+        "interactive": (4.0, max_waiting, wait_timeout),
+        "bulk": (1.0, max(max_waiting, 64), max(wait_timeout, 120.0)),
+    }
+    policies = {}
+    for name in LANES:
+        weight, queue, timeout = defaults[name]
+        prefix = f"UBIGKAS_LANE_{name.upper()}"
+        policies[name] = LanePolicy(
+            name,
+            weight=_env_float(f"{prefix}_WEIGHT", weight),
+            max_in_flight=_env_int(f"{prefix}_CONCURRENCY", 0) or None,
+            max_waiting=_env_int(f"{prefix}_QUEUE", queue),
+            wait_timeout=_env_float(f"{prefix}_TIMEOUT", timeout),
+        )
+    return policies
+
+class _Ticket:
+    __slots__ = ("lane", "enqueued", "granted")
+
+    def __init__(self, lane):
+        self.lane = lane
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+class StageLimiter:
+    """
+    Caps how many requests may run one model stage at once. Callers wait
+    in a per-lane queue; when a slot frees up, lanes are served by
+    start-time weighted fair queuing, so under contention interactive work
+    gets `weight`-proportionally more slots while bulk work still uses any
+    idle capacity. A request that has waited `starvation_seconds` is served
+    next regardless of weight. Anyone beyond a lane's queue limit, or
+    still waiting after its timeout, gets ServerBusy so overload turns
+    into fast 503s instead of a growing pile of threads.
+    """
+
+    def __init__(self, name, max_in_flight=1, max_waiting=8, wait_timeout=10.0,
+                 lanes=None, starvation_seconds=5.0):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.lanes = lanes or lane_policies(max_waiting, wait_timeout)
+        self.starvation_seconds = starvation_seconds
+        self._cond = threading.Condition()
+        self._active = 0
+        self._lane_active = {n: 0 for n in self.lanes}
+        self._queues = {n: deque() for n in self.lanes}
+        # Virtual time per lane and of the last dispatch (start-time fair queuing)
+        self._vtime = {n: 0.0 for n in self.lanes}
+        self._clock = 0.0
+        self._avg_seconds = 1.0
+        self.rejected = 0
+        self._lane_rejected = {n: 0 for n in self.lanes}
+
+    def _waiting(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def _retry_after(self):
+        backlog = (self._waiting() + 1) / max(self.max_in_flight, 1)
+        return max(1, math.ceil(self._avg_seconds * backlog))
+
+    def _eligible(self, name):
+        cap = self.lanes[name].max_in_flight
+        return self._lane_active[name] < (self.max_in_flight if cap is None else min(cap, self.max_in_flight))
+
+    def _pick(self):
+        """Lane to serve next, or None if no eligible lane has anyone waiting."""
+        candidates = [n for n, q in self._queues.items() if q and self._eligible(n)]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        starved = [n for n in candidates if now - self._queues[n][0].enqueued >= self.starvation_seconds]
+        if starved:
+            return min(starved, key=lambda n: self._queues[n][0].enqueued)
+        return min(candidates, key=lambda n: max(self._vtime[n], self._clock) + 1.0 / self.lanes[n].weight)
+
+    def _grant(self, name):
+        start = max(self._vtime[name], self._clock)
+        self._vtime[name] = start + 1.0 / self.lanes[name].weight
+        self._clock = start
+        self._active += 1
+        self._lane_active[name] += 1
+
+    def _dispatch(self):
+        granted = False
+        while self._active < self.max_in_flight:
+            name = self._pick()
+            if name is None:
+                break
+            self._queues[name].popleft().granted = True
+            self._grant(name)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _reject(self, name):
+        self.rejected += 1
+        self._lane_rejected[name] += 1
+        raise ServerBusy(self.name, self._retry_after())
+
+    def acquire(self, lane_name=None):
+        name = lane_name or current_lane()
+        if name not in self.lanes:
+            name = DEFAULT_LANE
+        policy = self.lanes[name]
+        with self._cond:
+            if self._active < self.max_in_flight and self._eligible(name) and self._pick() is None:
+                self._grant(name)
+            else:
+                queue = self._queues[name]
+                if len(queue) >= policy.max_waiting:
+                    self._reject(name)
+                ticket = _Ticket(name)
+                queue.append(ticket)
+                self._dispatch()
+                if not self._cond.wait_for(lambda: ticket.granted, policy.wait_timeout):
+                    queue.remove(ticket)
+                    self._reject(name)
+        return name, time.perf_counter()
+
+    def release(self, held):
+        name, started = held
+        with self._cond:
+            self._active -= 1
+            self._lane_active[name] -= 1
+            # Exponential moving average of time spent holding a slot
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.perf_counter() - started)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self):
+        held = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(held)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": self._active,
+                "waiting": self._waiting(),
+                "max_in_flight": self.max_in_flight,
+                "max_waiting": self.max_waiting,
+                "avg_seconds": round(self._avg_seconds, 4),
+                "rejected": self.rejected,
+                "lanes": {
+                    n: {
+                        "in_flight": self._lane_active[n],
+                        "waiting": len(self._queues[n]),
+                        "weight": p.weight,
+                        "max_in_flight": p.max_in_flight,
+                        "rejected": self._lane_rejected[n],
+                    }
+                    for n, p in self.lanes.items()
+                },
+            }
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def stage_limiter(name):
+    """Builds a limiter for `name` from UBIGKAS_<NAME>_CONCURRENCY / _QUEUE / _TIMEOUT."""
+    prefix = f"UBIGKAS_{name.upper()}"
+    max_waiting = _env_int(f"{prefix}_QUEUE", 8)
+    wait_timeout = _env_float(f"{prefix}_TIMEOUT", 10.0)
+    return StageLimiter(
+        name,
+        max_in_flight=_env_int(f"{prefix}_CONCURRENCY", 1),
+        max_waiting=max_waiting,
+        wait_timeout=wait_timeout,
+        lanes=lane_policies(max_waiting, wait_timeout),
+        starvation_seconds=_env_float("UBIGKAS_LANE_STARVATION_SECONDS", 5.0),
+    )
+
+# ==========================================
+# 2. DRAINING WSGI MIDDLEWARE
+# ==========================================
+class DrainingMiddleware:
+    """
+    Counts in-flight requests and, once draining starts, answers new ones
+    with 503 so the process can finish what it already accepted.
+    """
+
+    def __init__(self, app, retry_after=5):
+        self.app = app
+        self.retry_after = retry_after
+        self.draining = False
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def in_flight(self):
+        with self._cond:
+            return self._in_flight
+
+    def __call__(self, environ, start_response):
+        if self.draining:
+            start_response("503 Service Unavailable", [
+                ("Content-Type", "application/json"),
+                ("Retry-After", str(self.retry_after)),
+                ("Connection", "close"),
+            ])
+            return [b'{"error": "Server is shutting down"}']
+
+        with self._cond:
+            self._in_flight += 1
+        try:
+            result = self.app(environ, start_response)
+        except Exception:
+            self._done()
+            raise
+        return _ClosingIterator(result, self._done)
+
+    def _done(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def drain(self, timeout):
+        self.draining = True
+        with self._cond:
+            return self._cond.wait_for(lambda: self._in_flight == 0, timeout)
+
+class _ClosingIterator:
+    def __init__(self, iterable, on_close):
+        self._iterable = iterable
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self._iterable, "close"):
+                self._iterable.close()
+        finally:
+            self._on_close()
+
+# ==========================================
+# 3. FLASK INTEGRATION + PRODUCTION SERVER
+# ==========================================
+def install_error_handlers(app):
+    from flask import jsonify
+
+    @app.errorhandler(ServerBusy)
+    def _server_busy(e):
+        response = jsonify({"error": str(e), "stage": e.stage, "retry_after": e.retry_after})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response
+
+def request_lane():
+    """Lane from the X-Priority header, ?priority= or a JSON `priority` (default interactive)."""
+    from flask import request
+
+    value = request.headers.get("X-Priority") or request.args.get("priority")
+    if value is None and request.is_json:
+        data = request.get_json(silent=True)
+        value = data.get("priority") if isinstance(data, dict) else None
+    return value if value in LANES else DEFAULT_LANE
+
+def install_priority_lanes(app):
+    """Runs each request in the lane it asks for; bulk graders send X-Priority: bulk."""
+    from flask import g
+
+    @app.before_request
+    def _enter_lane():
+        g.ubigkas_lane_token = _current_lane.set(request_lane())
+
+    @app.teardown_request
+    def _leave_lane(exc):
+        token = g.pop("ubigkas_lane_token", None)
+        if token is not None:
+            try:
+                _current_lane.reset(token)
+            except ValueError:
+                _current_lane.set(DEFAULT_LANE)
+
+def request_budget_ms():
+    """Latency budget from the X-Latency-Budget-Ms header, ?budget_ms= or a JSON `budget_ms`."""
+    from flask import request
+
+    value = request.headers.get("X-Latency-Budget-Ms") or request.args.get("budget_ms")
+    if value is None and request.is_json:
+        data = request.get_json(silent=True)
+        value = data.get("budget_ms") if isinstance(data, dict) else None
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        return None
+    return budget if budget > 0 else None
+
+def serve(app, host="0.0.0.0", port=5000, threads=8, connection_limit=100,
+          channel_timeout=60, drain_timeout=30):
+    """
+    Runs `app` under waitress. SIGTERM/SIGINT stop new work, wait up to
+    `drain_timeout` seconds for in-flight requests, then exit.
+    """
+    from waitress.server import create_server
+
+    wsgi = DrainingMiddleware(app)
+    server = create_server(
+        wsgi, host=host, port=port, threads=threads,
+        connection_limit=connection_limit, channel_timeout=channel_timeout,
+    )
+    stop = threading.Event()
+
+    def _request_stop(signum, frame):
+        logger.info(f"Received signal {signum}; draining in-flight requests...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    worker = threading.Thread(target=server.run, name="waitress", daemon=True)
+    worker.start()
+    logger.info(f"Serving on http://{host}:{port} with {threads} threads")
+
+    while not stop.wait(1.0):
+        if not worker.is_alive():
+            return
+
+    if wsgi.drain(drain_timeout):
+        logger.info("All in-flight requests finished.")
+    else:
+        logger.warning(f"Drain timed out with {wsgi.in_flight} requests still running.")
+    # Give the I/O loop a moment to flush the last responses
+    time.sleep(1.0)
+    server.task_dispatcher.shutdown(cancel_pending=True, timeout=5)
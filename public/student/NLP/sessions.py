@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Idle sessions are dropped after this many seconds
+SESSION_TTL = float(os.environ.get("UBIGKAS_SESSION_TTL", 1800))
+MAX_SESSIONS = int(os.environ.get("UBIGKAS_MAX_SESSIONS", 5000))
+
+class SessionStore:
+    """
+    Per-session sentence results, kept in last-access order so expired
+    and excess sessions are evicted from the front on every access.
+    """
+
+    def __init__(self, ttl_seconds=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, (touched, _) = next(iter(self._sessions.items()))
+            if now - touched <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.get(session_id)
+            return entry[1] if entry else None
+
+    def put(self, session_id, results):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = (now, results)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+class _SharedReuse(dict):
+    """
+    A session's own sentence results that falls back to a shared
+    ResultCache of sentence results stored under `key(sentence)`.
+    """
+
+    def __init__(self, previous, results, key):
+        super().__init__(previous)
+        self._results = results
+        self._key = key
+
+    def __contains__(self, sentence):
+        if dict.__contains__(self, sentence):
+            return True
+        result = self._results.get(self._key(sentence))
+        if result is None:
+            return False
+        self[sentence] = result
+        return True
+
+def _kept(result):
+    return {k: v for k, v in result.items() if k != "reused"}
+
+def share_sentence_results(report, results, key):
+    """Stores a report's full-quality sentence results in `results` under `key(sentence)`."""
+    for result in report["sentences"]:
+        if result["degradation"] == "full" and not result["reused"]:
+            results.put(key(result["text"]), _kept(result))
+
+def correct_in_session(corrector, store, session_id, text, budget_ms=None, analyze=None,
+                       results=None, result_key=None):
+    """
+    Corrects `text` for a session: sentences unchanged since the session's
+    last submission reuse their stored result and only new or edited ones
+    go through the pipeline. Degraded results are not kept, so they are
+    retried on the next submission. With `analyze(report)`, its result is
+    added as "analysis" and each sentence carries its stage outputs.
+    With a shared `results` cache, sentences any request already corrected
+    are reused too, and new results are added to it (see
+    share_sentence_results). Returns the response payload.
+    """
+    session_id = session_id or uuid.uuid4().hex
+    previous = store.get(session_id) or {}
+    if results is not None:
+        previous = _SharedReuse(previous, results, result_key)
+    report = corrector.correct_with_report(text, budget_ms=budget_ms, reuse=previous)
+
+    # Only the current text's sentences are kept, so a session never grows past one draft
+    kept = {}
+    for result in report["sentences"]:
+        if result["degradation"] == "full":
+            kept[result["text"]] = _kept(result)
+    store.put(session_id, kept)
+    if results is not None:
+        share_sentence_results(report, results, result_key)
+
+    reused = sum(1 for r in report["sentences"] if r["reused"])
+    payload = {
+        "session_id": session_id,
+        "original": text,
+        "corrected": report["corrected"],
+        "degradation": report["degradation"],
+        "elapsed_ms": report["elapsed_ms"],
+        "edits": report["edits"],
+        "sentences": [{"text": r["text"], "corrected": r["corrected"], "reused": r["reused"]}
+                      for r in report["sentences"]],
+        "reused": reused,
+        "recomputed": len(report["sentences"]) - reused,
+    }
+    if analyze is not None:
+        for sentence, result in zip(payload["sentences"], report["sentences"]):
+            sentence["stages"] = result["stages"]
+        payload["analysis"] = analyze(report)
+    return payload
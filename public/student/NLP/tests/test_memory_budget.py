@@ -0,0 +1,27 @@
+"""
+Memory budget of the serving stack without models: the lexicons and
+caches a fresh server holds must fit memory_budget.json.
+"""
+import os
+import sys
+
+import pytest
+
+NLP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if NLP_DIR not in sys.path:
+    sys.path.insert(0, NLP_DIR)
+
+# The corrector module imports the model stack even though no model is loaded here
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+import memory_report  # noqa: E402
+
+def test_lexicons_and_caches_fit_budget():
+    memory_report.build_stack(load_models=False)
+    report = memory_report.memory_report()
+
+    assert not any(name.startswith("models/") for name in report["components"])
+    assert any(name.startswith("lexicons/") for name in report["components"])
+    assert "caches/definitions" in report["components"]
+    assert memory_report.check_budget(report, memory_report.load_budget()) == []
@@ -0,0 +1,31 @@
+"""
+Capture scrubbing: names, addresses and contact details must not reach
+the capture files, whatever case the student typed them in.
+"""
+import os
+import sys
+
+import pytest
+
+NLP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if NLP_DIR not in sys.path:
+    sys.path.insert(0, NLP_DIR)
+
+from traffic_capture import scrub_text  # noqa: E402
+
+@pytest.mark.parametrize("text, scrubbed", [
+    # Lowercase full names after a marker, surname included
+    ("Ako si juan dela cruz", "Ako si Juan"),
+    ("si maria ay kumain", "si Juan ay kumain"),
+    ("Kumain si maria at si pedro santos.", "Kumain si Juan at si Juan."),
+    # Sentence-initial and mid-sentence capitalised names
+    ("Maria ay kumain ng mansanas.", "Juan ay kumain ng mansanas."),
+    ("Ang bata ay naglaro kay Pedro Santos.", "Ang bata ay naglaro kay Juan."),
+    ("nakatira ako sa 123 Rizal St. Quezon City", "nakatira ako sa [ADDRESS] Juan"),
+    ("Tumawag ako sa 09171234567 at juan@example.com", "Tumawag ako sa [PHONE] at [EMAIL]"),
+])
+def test_scrub_text_removes_personal_details(text, scrubbed):
+    assert scrub_text(text) == scrubbed
+
+def test_scrub_text_keeps_ordinary_sentences():
+    assert scrub_text("Ang bata ay kumain ng mansanas.") == "Ang bata ay kumain ng mansanas."
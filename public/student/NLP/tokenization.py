@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from transformers import AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+# Encodings kept per tokenizer; sessions, warm-up and retried requests encode
+# the same sentences again and again
+ENCODE_CACHE_SIZE = int(os.environ.get("UBIGKAS_ENCODE_CACHE_SIZE", 2048))
+
+class CachedTokenizer:
+    """
+    A tokenizer with a bounded LRU of encodings keyed by the input text (or
+    pre-split words) and the call options. Cached encodings are shared
+    between calls, which is safe because the models only read them.
+    Everything else is forwarded to the wrapped tokenizer, so it drops in
+    wherever the tokenizer was used.
+    """
+
+    def __init__(self, tokenizer, max_entries=ENCODE_CACHE_SIZE):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._encodings = OrderedDict()
+        self._lock = threading.Lock()
+        self._id_table = None
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        if name == "tokenizer":
+            raise AttributeError(name)
+        return getattr(self.tokenizer, name)
+
+    @staticmethod
+    def _key(text, kwargs):
+        if isinstance(text, (list, tuple)) and all(isinstance(t, str) for t in text):
+            text = tuple(text)
+        elif not isinstance(text, str):
+            return None
+        key = (text, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def __call__(self, text, **kwargs):
+        key = self._key(text, kwargs) if self.max_entries else None
+        if key is None:
+            return self.tokenizer(text, **kwargs)
+        with self._lock:
+            encoding = self._encodings.get(key)
+            if encoding is not None:
+                self._encodings.move_to_end(key)
+                self.hits += 1
+                return encoding
+            self.misses += 1
+        encoding = self.tokenizer(text, **kwargs)
+        with self._lock:
+            self._encodings[key] = encoding
+            while len(self._encodings) > self.max_entries:
+                self._encodings.popitem(last=False)
+        return encoding
+
+    def id_table(self, words):
+        """
+        {word: convert_tokens_to_ids(word)} for a whole word list, built
+        once per list (a reloaded word list is a new list) from the vocabulary.
+        """
+        table = self._id_table
+        if table is None or table[0] is not words:
+            vocab = self.tokenizer.get_vocab()
+            unk = self.tokenizer.unk_token_id
+            table = self._id_table = (words, {w: vocab.get(w, unk) for w in words})
+        return table[1]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._encodings), "hits": self.hits, "misses": self.misses,
+                    "fast": bool(getattr(self.tokenizer, "is_fast", False))}
+
+def load_tokenizer(name, slow_class=None):
+    """
+    The Rust-backed (fast) tokenizer for `name` where one exists, else the
+    slow one (MarianMT only ships a sentencepiece tokenizer), wrapped in an
+    encode cache. `slow_class` is tried if the fast load fails outright.
+    """
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(name, use_fast=True)
+    except Exception as e:
+        if slow_class is None:
+            raise
+        logger.warning(f"Fast tokenizer unavailable for {name}, using {slow_class.__name__}: {e}")
+        tokenizer = slow_class.from_pretrained(name)
+    if not getattr(tokenizer, "is_fast", False):
+        logger.info(f"No fast tokenizer for {name}; using {type(tokenizer).__name__}")
+    return CachedTokenizer(tokenizer)
@@ -0,0 +1,291 @@
+"""
+Opt-in capture of /correct and /analyze traffic for replay benchmarks
+(see traffic_replay.py).
+
+    UBIGKAS_CAPTURE_SAMPLE_RATE=1 python server.py    # capture every request
+    UBIGKAS_CAPTURE_DIR=/var/ubigkas/captures         # default: NLP/captures
+
+Records go to gzip JSON Lines files, one per process and rotated every
+UBIGKAS_CAPTURE_MAX_RECORDS requests. Text is scrubbed before it is
+written: e-mail addresses, URLs, phone and ID numbers, street addresses,
+names after the personal markers (si, ni, kay, ...) and capitalised
+words missing from the Filipino wordlist (names, places) are replaced
+with placeholders, and session ids are replaced with per-process
+pseudonyms. No client address or other header besides the lane and
+latency budget is kept.
+"""
+import atexit
+import functools
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_DIR = os.environ.get(
+    "UBIGKAS_CAPTURE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "captures"))
+MAX_RECORDS_PER_FILE = int(os.environ.get("UBIGKAS_CAPTURE_MAX_RECORDS", 50000))
+FLUSH_SECONDS = 5.0
+QUEUE_SIZE = 10000
+
+# Capitalised words found here are ordinary words, not names
+WORDLIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Filipino-wordlist.txt")
+
+CAPTURED_PATHS = ("/correct", "/correct/session", "/correct/analyze", "/analyze", "/analyze/batch")
+# Request headers that change how a request is served; everything else is dropped
+KEPT_HEADERS = ("X-Priority", "X-Latency-Budget-Ms")
+# Response fields that differ between runs of the same build
+VOLATILE_KEYS = frozenset({"elapsed_ms", "session_id", "reused", "recomputed"})
+
+# ==========================================
+# 1. SCRUBBING
+# ==========================================
+_SCRUBBERS = [
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "[EMAIL]"),
+    (re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE), "[URL]"),
+    (re.compile(r"(?:\+?63|\b0)9\d{2}[\s-]?\d{3}[\s-]?\d{4}\b"), "[PHONE]"),
+    # House numbers up to a street name, and block/lot/purok/barangay numbers or names
+    (re.compile(r"\b\d+[A-Za-z]?(?:-\d+)?,?\s+(?:[A-ZÑ][\w'-]*\.?\s+){0,4}"
+                r"(?:St|Street|Ave|Avenue|Rd|Road|Blvd|Boulevard|Dr|Drive|Ln|Lane|Ext|Kalye|Daan)\b\.?"), "[ADDRESS]"),
+    (re.compile(r"\b(?:blk|block|lot|phase|purok|sitio|unit)\.?\s*\d+[A-Za-z]?\b", re.IGNORECASE), "[ADDRESS]"),
+    (re.compile(r"\b(?i:brgy\.?|barangay)\s+(?:\d+|[A-ZÑ][\w'-]*(?:\s+[A-ZÑ][\w'-]*)*)"), "[ADDRESS]"),
+    # Student numbers, LRNs and other long digit runs; years and ages stay
+    (re.compile(r"\b\d[\d-]{4,}\d\b"), "[ID]"),
+]
+# Personal names follow si/ni/kay (and plural sina/nina/kina), capitalised or not
+_MARKED_NAME = re.compile(r"\b((?i:si|ni|kay|sina|nina|kina)\s+)[^\W\d_][\w'-]*((?:\s+[^\W\d_][\w'-]*)*)")
+# A run of capitalised words, e.g. "Maria Clara" or "Quezon City"
+_CAPITALISED_RUN = re.compile(r"(?<![\w\[])[A-ZÑ][\w'-]*(?:\.?\s+[A-ZÑ][\w'-]*)*")
+# Salt for session pseudonyms; a new one per process, so they cannot be linked back
+_SALT = os.urandom(16)
+
+@functools.lru_cache(maxsize=1)
+def _known_words():
+    # Loaded on first use by the writer thread; without it every capitalised word is scrubbed
+    try:
+        with open(WORDLIST_PATH, "r", encoding="utf-8") as f:
+            return frozenset(line.strip().lower() for line in f if line.strip())
+    except OSError as e:
+        logger.warning(f"Wordlist unavailable for scrubbing ({e}); scrubbing all capitalised words")
+        return frozenset()
+
+def _scrub_capitalised(match):
+    # Leading known words (a sentence-initial "Ang", "Si") stay; the rest of the run is a name
+    known = _known_words()
+    words = re.split(r"(\.?\s+)", match.group(0))
+    for i in range(0, len(words), 2):
+        if words[i].lower() not in known:
+            return "".join(words[:i]) + "Juan"
+    return match.group(0)
+
+def _scrub_marked_name(match):
+    # The name runs on through capitalised words and words missing from the
+    # wordlist ("si juan dela cruz"), up to the first ordinary word
+    known = _known_words()
+    rest = re.split(r"(\s+)", match.group(2))
+    i = 1
+    while i < len(rest) and (rest[i + 1][:1].isupper() or rest[i + 1].lower() not in known):
+        i += 2
+    return match.group(1) + "Juan" + _MARKED_NAME.sub(_scrub_marked_name, "".join(rest[i:]))
+
+def scrub_text(text):
+    for pattern, replacement in _SCRUBBERS:
+        text = pattern.sub(replacement, text)
+    text = _MARKED_NAME.sub(_scrub_marked_name, text)
+    return _CAPITALISED_RUN.sub(_scrub_capitalised, text)
+
+def pseudonym(session_id):
+    return hmac.new(_SALT, str(session_id).encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+def scrub(value, key=None):
+    """`value` with every string scrubbed and session ids pseudonymized."""
+    if key == "session_id" and value is not None:
+        return pseudonym(value)
+    if isinstance(value, str):
+        return scrub_text(value)
+    if isinstance(value, dict):
+        return {k: scrub(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub(v) for v in value]
+    return value
+
+def output_digest(payload):
+    """Hash of a response payload without run-dependent fields, for comparing builds."""
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+    canonical = json.dumps(strip(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+# ==========================================
+# 2. LOG WRITER
+# ==========================================
+class CaptureLog:
+    """
+    Appends records to gzip JSON Lines from a background thread, so a
+    request only pays for a queue put. When the queue is full records are
+    dropped (and counted) rather than slowing requests down. The stream is
+    sync-flushed every few seconds, so a file cut off by a crash is still
+    readable up to the last flush.
+    """
+
+    def __init__(self, directory=CAPTURE_DIR, max_records=MAX_RECORDS_PER_FILE):
+        self.directory = directory
+        self.max_records = max_records
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._file = None
+        self._in_file = 0
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl.gz"
+        self.path = os.path.join(self.directory, name)
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self._in_file = 0
+        logger.info(f"Capturing traffic to {self.path}")
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, item):
+        if self._file is None or self._in_file >= self.max_records:
+            self._close_file()
+            self._open()
+        self._file.write(json.dumps(_record(*item), ensure_ascii=False) + "\n")
+        self._in_file += 1
+        self.written += 1
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=FLUSH_SECONDS)
+            except queue.Empty:
+                item = None
+            if item is StopIteration:
+                self._close_file()
+                return
+            if item is not None:
+                try:
+                    self._write(item)
+                except Exception as e:
+                    logger.error(f"Could not write capture record: {e}")
+            if self._file is not None and time.monotonic() - last_flush >= FLUSH_SECONDS:
+                self._file.flush()
+                self._file.buffer.flush(zlib.Z_SYNC_FLUSH)
+                last_flush = time.monotonic()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(StopIteration)
+            self._thread.join(timeout=10)
+
+def _record(at, method, path, args, body, headers, status, elapsed, output):
+    # Runs on the writer thread: scrubbing and hashing stay off the request path
+    record = {
+        "at": round(at, 3),
+        "method": method,
+        "path": path,
+        "args": scrub(args),
+        "json": scrub(body),
+        "headers": headers,
+        "status": status,
+        "ms": round(elapsed * 1000, 2),
+    }
+    # A scrubbed request no longer produces the recorded answer, so only
+    # untouched ones keep the output hash that replays are checked against
+    if output and record["args"] == args and _text_fields(record["json"]) == _text_fields(body):
+        try:
+            record["output"] = output_digest(json.loads(output))
+        except ValueError:
+            pass
+    return record
+
+def _text_fields(body):
+    # The body minus its session id, which is always pseudonymized
+    return {k: v for k, v in body.items() if k != "session_id"} if isinstance(body, dict) else body
+
+def read_capture(paths):
+    """Records from capture files or directories of them, ordered by arrival time."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, n) for n in sorted(os.listdir(path)) if n.endswith(".jsonl.gz"))
+        else:
+            files.append(path)
+    records = []
+    for path in files:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        records.append(json.loads(line))
+        except (EOFError, OSError, ValueError) as e:
+            # A file still being written (or cut off by a crash) ends mid-stream
+            logger.warning(f"{path}: read {len(records)} records so far, stopped at: {e}")
+    records.sort(key=lambda r: r["at"])
+    return records
+
+# ==========================================
+# 3. FLASK INTEGRATION
+# ==========================================
+def install_traffic_capture(app, rate=None, directory=None):
+    """
+    Captures a UBIGKAS_CAPTURE_SAMPLE_RATE fraction of /correct and
+    /analyze requests. With the rate unset no hooks are installed, so
+    normal serving pays nothing.
+    """
+    rate = float(os.environ.get("UBIGKAS_CAPTURE_SAMPLE_RATE", 0) or 0) if rate is None else rate
+    if rate <= 0:
+        return None
+
+    from flask import g, request
+
+    log = CaptureLog(directory or CAPTURE_DIR)
+
+    @app.before_request
+    def _start_capture():
+        if request.path in CAPTURED_PATHS and request.method in ("GET", "POST") and random.random() < rate:
+            g.ubigkas_capture = (time.time(), time.perf_counter())
+
+    @app.after_request
+    def _capture(response):
+        started = g.pop("ubigkas_capture", None)
+        if started is None:
+            return response
+        output = None
+        if response.is_json and not response.direct_passthrough:
+            output = response.get_data(as_text=True)
+        headers = {h: request.headers[h] for h in KEPT_HEADERS if h in request.headers}
+        log.put((started[0], request.method, request.path, request.args.to_dict(),
+                 request.get_json(silent=True), headers, response.status_code,
+                 time.perf_counter() - started[1], output))
+        return response
+
+    logger.info(f"Traffic capture enabled (sample rate {rate}) -> {log.directory}")
+    return log
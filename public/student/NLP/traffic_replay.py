@@ -0,0 +1,362 @@
+"""
+Replays captured traffic (see traffic_capture.py) and compares builds.
+
+    python traffic_replay.py replay captures/ --target http://localhost:5000 --out a.jsonl.gz
+    python traffic_replay.py replay captures/ --target lib --speed 0 --out b.jsonl.gz
+    python traffic_replay.py compare a.jsonl.gz b.jsonl.gz
+
+--speed 1 keeps the recorded arrival times, 2 replays twice as fast and 0
+sends as fast as --concurrency allows. Latency is measured from each
+request's scheduled send time, so time spent waiting for a free worker
+counts against the build being tested. The lib target answers with the
+Sentence Recognition server's payloads, so its outputs compare with that
+server's.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from traffic_capture import output_digest, read_capture
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ==========================================
+# 1. TARGETS
+# ==========================================
+class HttpTarget:
+    """A running server."""
+
+    def __init__(self, base_url, timeout=120):
+        self.name = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def send(self, record):
+        url = self.name + record["path"]
+        if record["args"]:
+            url += "?" + urllib.parse.urlencode(record["args"])
+        data = None
+        headers = dict(record.get("headers") or {})
+        if record["method"] == "POST":
+            data = json.dumps(record["json"] or {}).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(url, data=data, headers=headers, method=record["method"])
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, json.load(resp)
+        except urllib.error.HTTPError as e:
+            try:
+                return e.code, json.load(e)
+            except ValueError:
+                return e.code, None
+
+class LibraryTarget:
+    """
+    The corrector and analyzer in this process, called the way the
+    servers call them (same lanes, budgets and session handling), without
+    HTTP in between.
+    """
+
+    def __init__(self):
+        rules_dir = os.path.abspath(os.path.join(BASE_DIR, "..", "Sentence Recognition"))
+        if rules_dir not in sys.path:
+            sys.path.append(rules_dir)
+        from filipino_grammar_corrector import FilipinoGrammarCorrector
+        from sessions import SessionStore
+        from http_cache import normalize_sentence
+        import payloads
+
+        self.name = "lib"
+        self.corrector = FilipinoGrammarCorrector(
+            tl_en_model=os.path.join(BASE_DIR, "final_tl_en_translator"),
+            en_tl_model=os.path.join(BASE_DIR, "final_tagalog_translator"),
+            spelling_model_path=os.path.join(BASE_DIR, "my_spelling_model"),
+        )
+        self.sessions = SessionStore()
+        # The Sentence Recognition server's own payload builders
+        self._payloads = payloads
+        self._normalize = normalize_sentence
+
+    @staticmethod
+    def _option(record, name, header=None):
+        value = (record.get("headers") or {}).get(header) if header else None
+        if value is None:
+            value = record["args"].get(name)
+        if value is None and isinstance(record["json"], dict):
+            value = record["json"].get(name)
+        return value
+
+    def _text(self, record):
+        value = self._option(record, "sentence")
+        if value is None and isinstance(record["json"], dict):
+            value = record["json"].get("text")
+        return self._normalize(value) if isinstance(value, str) else ""
+
+    def send(self, record):
+        from resources import RESOURCES
+        from serving import lane, LANES, DEFAULT_LANE
+
+        requested = self._option(record, "priority", "X-Priority")
+        try:
+            budget = float(self._option(record, "budget_ms", "X-Latency-Budget-Ms"))
+        except (TypeError, ValueError):
+            budget = None
+        with RESOURCES.pinned(), lane(requested if requested in LANES else DEFAULT_LANE):
+            try:
+                return self._dispatch(record, budget if budget and budget > 0 else None)
+            except Exception as e:
+                return 500, {"error": str(e)}
+
+    def _dispatch(self, record, budget):
+        from sessions import correct_in_session
+
+        path = record["path"]
+        if path == "/analyze/batch":
+            sentences = (record["json"] or {}).get("sentences")
+            if not isinstance(sentences, list) or not sentences:
+                return 400, {"error": "No sentences provided"}
+            return 200, {"results": self._payloads.batch_payloads(sentences)}
+
+        text = self._text(record)
+        if not text:
+            return 400, {"error": "No sentence provided"}
+        session_id = (record["json"] or {}).get("session_id") if isinstance(record["json"], dict) else None
+
+        if path == "/analyze":
+            return 200, self._payloads.analyze_payload(text)
+        if path == "/correct/session" or (path == "/correct/analyze" and session_id):
+            analyze = self._payloads.stage_analysis if path == "/correct/analyze" else None
+            return 200, correct_in_session(self.corrector, self.sessions, session_id, text,
+                                           budget_ms=budget, analyze=analyze)
+
+        report = self.corrector.correct_with_report(text, budget_ms=budget)
+        if path == "/correct/analyze":
+            return 200, self._payloads.correct_analyze_payload(text, report)
+        return 200, self._payloads.correction_payload(text, report)
+
+def make_target(spec, timeout=120):
+    return LibraryTarget() if spec == "lib" else HttpTarget(spec, timeout)
+
+# ==========================================
+# 2. REPLAY
+# ==========================================
+def _input_text(record):
+    body = record["json"] if isinstance(record["json"], dict) else {}
+    text = record["args"].get("sentence") or body.get("sentence") or body.get("text")
+    if text is None and isinstance(body.get("sentences"), list):
+        text = " | ".join(s for s in body["sentences"] if isinstance(s, str))
+    return (text or "")[:200]
+
+def replay(records, target, speed=1.0, concurrency=8):
+    """
+    Sends every record to `target` on the recorded schedule scaled by
+    `speed` and returns one result per record, in record order.
+    """
+    # Session ids get a per-run prefix so a server's stored drafts from earlier runs are not reused
+    run_prefix = uuid.uuid4().hex[:8]
+    results = [None] * len(records)
+    first_at = records[0]["at"] if records else 0.0
+    lock = threading.Lock()
+    done = [0]
+
+    def _run(i, record, due):
+        if isinstance(record["json"], dict) and record["json"].get("session_id"):
+            record = dict(record, json=dict(record["json"], session_id=f"r{run_prefix}-{record['json']['session_id']}"))
+        sent = time.perf_counter()
+        try:
+            status, payload = target.send(record)
+        except Exception as e:
+            status, payload = None, {"error": str(e)}
+        finished = time.perf_counter()
+        result = {
+            "i": i,
+            "path": record["path"],
+            "status": status,
+            "latency_ms": round((finished - due) * 1000, 2),
+            "service_ms": round((finished - sent) * 1000, 2),
+            "output": output_digest(payload) if status == 200 and payload is not None else None,
+            "recorded_output": record.get("output"),
+            "input": _input_text(record),
+        }
+        if isinstance(payload, dict):
+            result["corrected"] = payload.get("corrected")
+            if status != 200:
+                result["error"] = payload.get("error")
+        results[i] = result
+        with lock:
+            done[0] += 1
+            if done[0] % 500 == 0:
+                logger.info(f"Replayed {done[0]}/{len(records)}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, record in enumerate(records):
+            due = started + (record["at"] - first_at) / speed if speed > 0 else time.perf_counter()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_run, i, record, due)
+    return results
+
+def save_run(path, meta, results):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"run": meta}, ensure_ascii=False) + "\n")
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+def load_run(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        meta = json.loads(f.readline())["run"]
+        return meta, [json.loads(line) for line in f if line.strip()]
+
+# ==========================================
+# 3. COMPARISON
+# ==========================================
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100.0 * len(sorted_values)))]
+
+def latency_summary(results):
+    """Per-path (and "all") request counts, errors and latency percentiles."""
+    by_path = {}
+    for r in results:
+        for key in (r["path"], "all"):
+            by_path.setdefault(key, []).append(r)
+    summary = {}
+    for path, rows in sorted(by_path.items()):
+        latencies = sorted(r["latency_ms"] for r in rows if r["status"] == 200)
+        summary[path] = {
+            "requests": len(rows),
+            "errors": sum(1 for r in rows if r["status"] != 200),
+            "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50_ms": _percentile(latencies, 50),
+            "p90_ms": _percentile(latencies, 90),
+            "p99_ms": _percentile(latencies, 99),
+            "max_ms": latencies[-1] if latencies else None,
+        }
+    return summary
+
+def compare_runs(base, other, examples=10):
+    """
+    Latency side by side (other vs base, in %) and how many outputs
+    differ per path, with a few differing inputs to look at.
+    """
+    base_stats, other_stats = latency_summary(base), latency_summary(other)
+    latency = {}
+    for path in sorted(set(base_stats) | set(other_stats)):
+        a, b = base_stats.get(path, {}), other_stats.get(path, {})
+        row = {"base": a, "other": b}
+        for stat in ("p50_ms", "p90_ms", "p99_ms", "mean_ms"):
+            if a.get(stat) and b.get(stat) is not None:
+                row[stat.replace("_ms", "_change_pct")] = round((b[stat] - a[stat]) / a[stat] * 100, 1)
+        latency[path] = row
+
+    other_by_index = {r["i"]: r for r in other}
+    outputs, differing = {}, []
+    for r in base:
+        o = other_by_index.get(r["i"])
+        if o is None or r["status"] != 200 or o["status"] != 200:
+            continue
+        counts = outputs.setdefault(r["path"], {"compared": 0, "same": 0, "different": 0})
+        counts["compared"] += 1
+        if r["output"] == o["output"]:
+            counts["same"] += 1
+        else:
+            counts["different"] += 1
+            if len(differing) < examples:
+                differing.append({"i": r["i"], "path": r["path"], "input": r["input"],
+                                  "base": r.get("corrected"), "other": o.get("corrected")})
+    return {"latency": latency, "outputs": outputs, "examples": differing}
+
+def _print_comparison(report, base_name, other_name):
+    print(f"base: {base_name}\nother: {other_name}\n")
+    print(f"{'path':<20} {'requests':>9} {'errors':>11} {'p50 ms':>19} {'p90 ms':>19} {'p99 ms':>19}")
+    for path, row in report["latency"].items():
+        a, b = row["base"], row["other"]
+
+        def cell(stat):
+            change = row.get(stat.replace("_ms", "_change_pct"))
+            return f"{a.get(stat)}->{b.get(stat)}" + (f" ({change:+.0f}%)" if change is not None else "")
+        print(f"{path:<20} {b.get('requests', 0):>9} {str(a.get('errors')) + '->' + str(b.get('errors')):>11} "
+              f"{cell('p50_ms'):>19} {cell('p90_ms'):>19} {cell('p99_ms'):>19}")
+    print()
+    for path, counts in sorted(report["outputs"].items()):
+        print(f"{path:<20} outputs same {counts['same']}/{counts['compared']}, different {counts['different']}")
+    for ex in report["examples"]:
+        print(f"  #{ex['i']} {ex['path']} {ex['input']!r}\n      base:  {ex['base']!r}\n      other: {ex['other']!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured UBigkas traffic and compare builds")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("replay")
+    run.add_argument("captures", nargs="+", help="Capture files or directories")
+    run.add_argument("--target", required=True, help="Server base URL, or 'lib' for the in-process APIs")
+    run.add_argument("--speed", type=float, default=1.0, help="Rate multiplier; 0 = as fast as possible")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--paths", help="Comma-separated paths to replay (default: all)")
+    run.add_argument("--limit", type=int, help="Replay only the first N records")
+    run.add_argument("--timeout", type=float, default=120)
+    run.add_argument("--out", help="Save the results (.jsonl.gz) for a later compare")
+    run.add_argument("--baseline", help="Compare against a saved run right away")
+    cmp = sub.add_parser("compare")
+    cmp.add_argument("base")
+    cmp.add_argument("other")
+    cmp.add_argument("--examples", type=int, default=10)
+    cmp.add_argument("--json", action="store_true", help="Print the raw comparison")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "compare":
+        (base_meta, base), (other_meta, other) = load_run(args.base), load_run(args.other)
+        if (base_meta["target"] == "lib") != (other_meta["target"] == "lib"):
+            logger.warning("Comparing an HTTP run with a lib run; outputs only line up for the "
+                           "Sentence Recognition server")
+        report = compare_runs(base, other, args.examples)
+        if args.json:
+            print(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            _print_comparison(report, f"{args.base} ({base_meta['target']})", f"{args.other} ({other_meta['target']})")
+        return
+
+    records = read_capture(args.captures)
+    if args.paths:
+        wanted = set(args.paths.split(","))
+        records = [r for r in records if r["path"] in wanted]
+    records = records[:args.limit] if args.limit else records
+    if not records:
+        parser.error("No captured requests to replay")
+
+    target = make_target(args.target, args.timeout)
+    started = time.time()
+    results = replay(records, target, speed=args.speed, concurrency=args.concurrency)
+    meta = {"target": target.name, "speed": args.speed, "concurrency": args.concurrency,
+            "records": len(records), "started": started, "seconds": round(time.time() - started, 2),
+            "build": os.environ.get("UBIGKAS_BUILD", "dev")}
+    if args.out:
+        save_run(args.out, meta, results)
+        logger.info(f"Saved {len(results)} results to {args.out}")
+
+    for path, stats in latency_summary(results).items():
+        print(f"{path:<20} {json.dumps(stats)}")
+    recorded = [r for r in results if r["recorded_output"] and r["output"]]
+    if recorded and target.name != "lib":
+        same = sum(1 for r in recorded if r["output"] == r["recorded_output"])
+        print(f"Outputs matching the captured build: {same}/{len(recorded)}")
+    if args.baseline:
+        base_meta, base = load_run(args.baseline)
+        print()
+        _print_comparison(compare_runs(base, results), f"{args.baseline} ({base_meta['target']})", target.name)
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,144 @@
 import re
+import json
 import os
 import torch
 import logging
-from collections import Counter
+from collections import Counter, namedtuple
+from contextlib import ExitStack, contextmanager
 from spellchecker import SpellChecker
 from transformers import RobertaTokenizer, RobertaForMaskedLM
+from document import Document
+from model_registry import REGISTRY
+from resources import RESOURCES
+from tokenization import load_tokenizer
+import ngram_ranker
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Ensure these files exist in the same directory as the script
+WORDLIST_PATH = os.path.join(BASE_DIR, 'Filipino-wordlist.txt')
+SLANG_PATH = os.path.join(BASE_DIR, 'slang_map.txt')
+TYPO_OVERRIDES_PATH = os.path.join(BASE_DIR, 'typo_overrides.json')
+
+Wordlist = namedtuple("Wordlist", ["words", "spell"])
+
+# ==========================================
+# RESOURCE LOADERS (reloadable, see resources.py)
+# ==========================================
+def load_wordlist(path):
+    spell = SpellChecker(language=None, distance=2)
+    words = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            words = [line.strip().lower() for line in f if line.strip()]
+        spell.word_frequency.load_words(words)
+        logger.info(f"✅ Dictionary Loaded: {len(words)} words")
+    else:
+        logger.warning(f"⚠️ Warning: Wordlist not found at {path}")
+    return Wordlist(words, spell)
+
+def load_slang_map(path):
+    slang_map = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if '=' in line and not line.startswith('#'):
+                    key, value = line.split('=', 1)
+                    slang_map[key.strip().lower()] = value.strip()
+    return slang_map
+
+def load_typo_overrides(path):
+    # Misspelling -> ordered candidates, for typos too far from the intended word
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {k.lower(): list(v) for k, v in json.load(f).items()}
+
+def load_context_ranker(model_path, *corpus):
+    # n-gram counts from context_corpus.txt + quiz sentences; the saved model only if built from them
+    try:
+        ranker = ngram_ranker.load_default(list(corpus), model_path)
+        logger.info(f"✅ Context Ranker Loaded: {len(ranker.vocab)} words")
+        return ranker
+    except Exception as e:
+        logger.warning(f"⚠️ Context ranker unavailable: {e}")
+        return None
+
+def register_resources():
+    RESOURCES.register("wordlist", [WORDLIST_PATH], load_wordlist)
+    RESOURCES.register("slang_map", [SLANG_PATH], load_slang_map)
+    RESOURCES.register("typo_overrides", [TYPO_OVERRIDES_PATH], load_typo_overrides)
+    RESOURCES.register("context_ranker", [ngram_ranker.DEFAULT_MODEL_PATH] + ngram_ranker.DEFAULT_CORPUS,
+                       load_context_ranker)
+
 class UBigkasProcessor:
     # UPDATED: Points to the Hugging Face Hub repository
-    def __init__(self, model_path="Vinci14/my_spelling_model"):
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Ensure these files exist in the same directory as the script
-        dictionary_path = os.path.join(base_dir, 'Filipino-wordlist.txt')
-        slang_path = os.path.join(base_dir, 'slang_map.txt')
+    def __init__(self, model_path="Vinci14/my_spelling_model", ngram_margin=1.0):
+        # 1-4. Wordlist, slang map, typo overrides and context ranker live in
+        # the shared resource bundle and can be reloaded without a restart
+        register_resources()
 
-        self.spell = SpellChecker(language=None, distance=2) 
-        
-        # 1. Load Wordlist
-        self.word_list = []
-        if os.path.exists(dictionary_path):
-            with open(dictionary_path, 'r', encoding='utf-8') as f:
-                self.word_list = [line.strip().lower() for line in f if line.strip()]
-            self.spell.word_frequency.load_words(self.word_list)
-            logger.info(f"✅ Dictionary Loaded: {len(self.word_list)} words")
-        else:
-            logger.warning(f"⚠️ Warning: Wordlist not found at {dictionary_path}")
-
-        # 2. Load Slang Map
-        self.slang_map = {}
-        if os.path.exists(slang_path):
-            with open(slang_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if '=' in line and not line.startswith('#'):
-                        key, value = line.split('=', 1)
-                        self.slang_map[key.strip().lower()] = value.strip()
-        
-        # 3. Finalized Overrides
-        self.typo_overrides = {
-            'gnto': ['ganito', 'ginto'],
-            'pntahan': ['puntahan', 'pintahan'],
-            'pnta': ['punta', 'pinta'],
-            'bhy': ['bahay', 'buhay'],
-            'bhay': ['bahay', 'buhay'],
-        }
-
-        # 4. Finalized Triggers
-        self.jewelry_words = {'singsing', 'kwintas', 'kuwintas', 'hikaw', 'ginto', 'alahas', 'suot', 'presyo'}
-        self.paint_words = {'pader', 'dingding', 'kulay', 'pintura', 'pula', 'asul', 'berde', 'dilaw', 'puti', 'itim'}
-
-        # 5. Load Fine-Tuned Brain (Updated for Hugging Face)
-        self.model = None
-        self.tokenizer = None
-        
-        logger.info(f"🔄 Attempting to load model from: {model_path}...")
-        try:
-            # Removed 'local_files_only=True' to allow downloading from Hub
-            self.tokenizer = RobertaTokenizer.from_pretrained(model_path)
-            self.model = RobertaForMaskedLM.from_pretrained(model_path)
-            self.model.eval()
-            logger.info("✅ Context Brain (Fine-Tuned) Loaded Successfully")
-        except Exception as e:
-            logger.error(f"❌ Model load failed: {e}")
-            logger.info("⚠️ System will continue using only dictionary/edit-distance logic.")
+        # The ranker's pick is used when it beats the runner-up by
+        # `ngram_margin` (log space); closer calls go to BERT.
+        self.ngram_margin = ngram_margin
+
+        # 5. Fine-Tuned Brain (Updated for Hugging Face): loaded through the
+        # shared model registry the first time a word needs reranking
+        self.model_path = model_path
+        self.model_key = REGISTRY.register(f"spelling:{model_path}", self._load_model)
+        self.model_failed = False
+
+    # --- Lexicon (from the bundle pinned for the current request) ---
+    @property
+    def word_list(self):
+        return RESOURCES.get("wordlist").words
+
+    @property
+    def spell(self):
+        return RESOURCES.get("wordlist").spell
+
+    @property
+    def slang_map(self):
+        return RESOURCES.get("slang_map")
+
+    @property
+    def typo_overrides(self):
+        return RESOURCES.get("typo_overrides")
+
+    @property
+    def ranker(self):
+        return RESOURCES.get("context_ranker")
+
+    def _load_model(self):
+        logger.info(f"🔄 Attempting to load model from: {self.model_path}...")
+        # Removed 'local_files_only=True' to allow downloading from Hub
+        tokenizer = load_tokenizer(self.model_path, RobertaTokenizer)
+        model = RobertaForMaskedLM.from_pretrained(self.model_path)
+        model.eval()
+        logger.info("✅ Context Brain (Fine-Tuned) Loaded Successfully")
+        return tokenizer, model
+
+    @contextmanager
+    def _context_model(self):
+        """
+        (tokenizer, model) pinned in the registry for the block, so a memory
+        budget eviction cannot unload it mid-inference; (None, None) if the
+        model could not be loaded.
+        """
+        if self.model_failed:
+            yield None, None
+            return
+        with ExitStack() as stack:
+            try:
+                value = stack.enter_context(REGISTRY.use(self.model_key))
+            except Exception as e:
+                self.model_failed = True
+                logger.error(f"❌ Model load failed: {e}")
+                logger.info("⚠️ System will continue using only dictionary/edit-distance logic.")
+                value = None, None
+            yield value
 
     def _tokenize(self, text):
         return re.findall(r"\w+|[^\w\s]|\s+", text, re.UNICODE)
@@ -81,17 +154,10 @@ class UBigkasProcessor:
             prev = curr
         return prev[-1]
 
-    def get_candidates(self, word, context_words=None):
+    def get_candidates(self, word):
         word_lower = word.lower()
         if word_lower in self.spell.known([word_lower]): return [word] 
 
-        # Context Trigger Logic
-        if context_words:
-            if word_lower == 'gnto' and any(j in context_words for j in self.jewelry_words):
-                return ['ginto']
-            if word_lower in ['pntahan', 'pnta'] and any(p in context_words for p in self.paint_words):
-                return ['pintahan'] if word_lower == 'pntahan' else ['pinta']
-
         # Override Logic
         if word_lower in self.typo_overrides:
             valid = [c for c in self.typo_overrides[word_lower] if c in self.word_list]
@@ -109,56 +175,119 @@ class UBigkasProcessor:
         return possible[:15]
 
     def _rank_with_bert(self, tokens, idx, candidates):
-        if not self.model: return candidates[0]
-        try:
-            prefix, suffix = "".join(tokens[:idx]), "".join(tokens[idx+1:])
-            # Insert mask token properly
-            masked = f"{prefix}{self.tokenizer.mask_token}{suffix}"
-            inputs = self.tokenizer(masked, return_tensors="pt")
+        with self._context_model() as (tokenizer, model):
+            if not model: return candidates[0]
+            try:
+                prefix, suffix = "".join(tokens[:idx]), "".join(tokens[idx+1:])
+                # Insert mask token properly
+                masked = f"{prefix}{tokenizer.mask_token}{suffix}"
+                inputs = tokenizer(masked, return_tensors="pt")
             
-            # Find the index of the mask token
-            m_idx = (inputs.input_ids == self.tokenizer.mask_token_id)[0].nonzero(as_tuple=True)[0]
+                # Find the index of the mask token
+                m_idx = (inputs.input_ids == tokenizer.mask_token_id)[0].nonzero(as_tuple=True)[0]
             
-            with torch.no_grad():
-                logits = self.model(**inputs).logits
-            
-            best_c, best_s = candidates[0], -float('inf')
+                # Candidate ids as convert_tokens_to_ids gives them, from the table
+                # built once for the word list. For simplicity in spelling correction
+                # we assume single-token replacement overlap, so a candidate the
+                # vocabulary doesn't hold whole (unknown token) is skipped.
+                ids = tokenizer.id_table(self.word_list)
+                known = []
+                for c in candidates:
+                    c_id = ids[c] if c in ids else tokenizer.convert_tokens_to_ids(c)
+                    if c_id != tokenizer.unk_token_id:
+                        known.append((c, c_id))
+                if not known or m_idx.numel() != 1:
+                    return candidates[0]
+
+                with torch.no_grad():
+                    logits = model(**inputs).logits
             
-            for c in candidates:
-                # Tokenize candidate to check if it's a single token or subwords
-                # Ideally, we check the probability of the first token if it splits, 
-                # but for simplicity in spelling correction, we assume single-token replacement overlap.
-                c_id = self.tokenizer.convert_tokens_to_ids(c)
-                
-                # Skip unknown tokens
-                if c_id == self.tokenizer.unk_token_id: continue
-                
-                score = logits[0, m_idx, c_id].item()
-                if score > best_s: best_s, best_c = score, c
-            return best_c
-        except Exception as e:
-            # logger.debug(f"BERT ranking error: {e}")
-            return candidates[0]
+                # One gather for all candidates; argmax keeps the first of equal scores
+                scores = logits[0, m_idx[0], torch.tensor([c_id for _, c_id in known])]
+                return known[int(scores.argmax())][0]
+            except Exception as e:
+                # logger.debug(f"BERT ranking error: {e}")
+                return candidates[0]
 
-    def process_sentence(self, text):
-        text = self.normalize_slang(text)
-        tokens = self._tokenize(text)
+    def process_sentence(self, text, rerank=True):
+        # rerank=False skips the BERT pass and keeps the top edit-distance candidate
+        doc = Document(text)
+        self.annotate(doc, rerank=rerank)
+        return doc.output_text()
+
+    def annotate(self, doc, index=None, rerank=True):
+        """
+        Spelling stage over sentence `index` of a Document (or all of it):
+        sets each token's `norm` (slang expanded) and `correction` in place.
+        """
+        positions = doc.token_range(index)
+
+        # A slang expansion can be several words, so candidates are picked per
+        # piece of the normalized tokens and joined back onto their owner.
+        pieces, owners = [], []
+        for pos in positions:
+            tok = doc.tokens[pos]
+            tok.norm = self._match_case(tok.text, self.slang_map.get(tok.text.lower(), tok.text))
+            for piece in self._tokenize(tok.norm):
+                pieces.append(piece)
+                owners.append(pos)
         
-        # Build context set for trigger words
-        ctx = {t.lower() for t in tokens if t.isalnum()}
+        # Context words for the ranker
+        ctx = {t.lower() for t in pieces if t.isalnum()}
         
-        final = []
-        for i, t in enumerate(tokens):
-            if t.strip() and t.isalnum():
-                cands = self.get_candidates(t, ctx)
-                # Only use BERT if we have multiple valid candidates and the model is loaded
-                if len(cands) > 1 and self.model:
-                    final.append(self._match_case(t, self._rank_with_bert(tokens, i, cands)))
-                else:
-                    final.append(self._match_case(t, cands[0]))
+        for pos in positions:
+            doc.tokens[pos].correction = ""
+        out = list(pieces)
+        words = [i for i, t in enumerate(pieces) if t.isalnum()]
+        for n, i in enumerate(words):
+            t = pieces[i]
+            cands = self.get_candidates(t)
+            if len(cands) > 1:
+                # Left neighbour is already corrected; BERT still sees the input as typed
+                left = out[words[n-1]] if n else None
+                right = pieces[words[n+1]] if n + 1 < len(words) else None
+                out[i] = self._match_case(t, self._choose(pieces, i, cands, ctx, rerank, left, right))
             else:
-                final.append(t)
-        return self.post_process("".join(final))
+                out[i] = self._match_case(t, cands[0])
+        for t, pos in zip(out, owners):
+            doc.tokens[pos].correction += t
+        self._post_process_tokens([doc.tokens[pos] for pos in positions])
+
+    def _choose(self, pieces, idx, cands, ctx, rerank, left=None, right=None):
+        # Cheap n-gram ranking first; BERT only when the n-gram call is close
+        if self.ranker:
+            best, margin = self.ranker.rank(cands, left, right, ctx)
+            if margin >= self.ngram_margin:
+                return best
+        # Only use BERT if the model is available and this request allows it
+        if rerank and not self.model_failed:
+            return self._rank_with_bert(pieces, idx, cands)
+        return cands[0]
+
+    def _post_process_tokens(self, tokens):
+        # post_process() applied to the tokens' corrections, so offsets survive
+        if not "".join(t.correction for t in tokens).strip():
+            for t in tokens: t.correction = ""
+            return
+
+        # Capitalize first valid alphanumeric char
+        for t in tokens:
+            idx = next((i for i, c in enumerate(t.correction) if c.isalnum()), None)
+            if idx is not None:
+                t.correction = t.correction[:idx] + t.correction[idx].upper() + t.correction[idx+1:]
+                break
+
+        # Fix spacing around punctuation (walk backwards to see what follows)
+        before_punct = False
+        for t in reversed(tokens):
+            t.correction = re.sub(r'\s+([?.!,])', r'\1', t.correction)
+            if before_punct: t.correction = t.correction.rstrip()
+            if t.correction: before_punct = t.correction[0] in "?.!,"
+
+        # Ensure ending punctuation
+        last = next(t for t in reversed(tokens) if t.correction.strip())
+        if last.correction.strip()[-1] not in ".?!":
+            tokens[-1].correction += "."
 
     def normalize_slang(self, text):
         if not text: return ""
@@ -0,0 +1,177 @@
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Sentinel stored on disk for words no source could define
+NO_DEFINITION = "No definition found."
+
+def first_match(*sources):
+    """Chain lookup sources; the first one returning a record wins."""
+    def lookup(word):
+        for source in sources:
+            record = source(word)
+            if record is not None:
+                return record
+        return None
+    return lookup
+
+class DefinitionCache:
+    """
+    Two-tier cache in front of a definition source.
+
+    `source(word)` returns a record dict (definition, type, suggested_word,
+    corrected) or None when it has nothing. Misses are cached too, and are
+    written to disk as the plain "No definition found." string. Disk writes
+    are batched on a timer and land through a temp file + os.replace, so a
+    crash never leaves a half-written cache behind.
+
+    `version()` names the data the source answers from (the lexicon
+    fingerprint). Both tiers belong to one version, which is stored in
+    the file: a file from another version (or the old unversioned format)
+    is discarded at load, and a lookup made under any other version goes
+    straight to the source without being cached. reset() moves the cache
+    to a new version.
+    """
+
+    def __init__(self, source, path=None, max_memory_entries=4096,
+                 max_disk_entries=50000, flush_delay=2.0, version=None):
+        self.source = source
+        self.path = path
+        self.version = version
+        self._version = version() if version else None
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.flush_delay = flush_delay
+
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._timer = None
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            self._load()
+            atexit.register(self.flush)
+
+    # --- Disk tier ---
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable definition cache {self.path}: {e}")
+            return
+        if not isinstance(stored, dict) or stored.get("version") != self._version:
+            # Suggestions and misses were computed against another lexicon
+            logger.info(f"Discarding definition cache {self.path} (built for another lexicon version)")
+            self._schedule_flush()
+            return
+        for word, value in stored.get("entries", {}).items():
+            self._disk[word] = None if value == NO_DEFINITION else value
+        self._trim(self._disk, self.max_disk_entries)
+
+    def _schedule_flush(self):
+        self._dirty = True
+        if self._timer is None and self.path:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty or not self.path:
+                return
+            snapshot = {"version": self._version,
+                        "entries": {w: (NO_DEFINITION if r is None else r) for w, r in self._disk.items()}}
+            self._dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".dictionary_cache.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to write definition cache {self.path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # --- Lookups ---
+    @staticmethod
+    def _trim(tier, limit):
+        while len(tier) > limit:
+            tier.popitem(last=False)
+
+    def _current(self):
+        # False while the caller is pinned to a lexicon the cache does not hold
+        return self.version is None or self.version() == self._version
+
+    def get(self, word):
+        key = word.lower()
+        if not self._current():
+            return self.source(key)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if key in self._disk:
+                record = self._disk[key]
+                self._disk.move_to_end(key)
+                self._remember(key, record)
+                self.hits += 1
+                return record
+
+        self.misses += 1
+        record = self.source(key)
+        self.put(key, record)
+        return record
+
+    def _remember(self, key, record):
+        self._memory[key] = record
+        self._memory.move_to_end(key)
+        self._trim(self._memory, self.max_memory_entries)
+
+    def put(self, word, record):
+        key = word.lower()
+        if not self._current():
+            return
+        with self._lock:
+            self._remember(key, record)
+            if self.path:
+                self._disk[key] = record
+                self._disk.move_to_end(key)
+                self._trim(self._disk, self.max_disk_entries)
+                self._schedule_flush()
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._memory.clear()
+            if disk:
+                self._disk.clear()
+                self._schedule_flush()
+
+    def reset(self, version):
+        """Empties both tiers and starts caching for `version`."""
+        with self._lock:
+            self._version = version
+            self.clear(disk=True)
+
+    def __len__(self):
+        with self._lock:
+            return len(set(self._memory) | set(self._disk))
@@ -2,12 +2,49 @@ import json
 import re
 import difflib
 import os
+import sys
+from collections import namedtuple
+from definition_cache import DefinitionCache
+from morphology import MorphologicalAnalyzer, load_affix_rules
 
-# Load dictionary
-with open(os.path.join(os.path.dirname(__file__), "tagalog_dictionary.json"), "r", encoding="utf-8") as f:
-    TAGALOG_DICT = json.load(f)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NLP_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "NLP"))
+if NLP_DIR not in sys.path:
+    sys.path.append(NLP_DIR)
+from resources import RESOURCES, CurrentResource
 
-VALID_WORDS = set(entry["word"].lower() for entry in TAGALOG_DICT)
+DICTIONARY_PATH = os.path.join(BASE_DIR, "tagalog_dictionary.json")
+AFFIX_RULES_PATH = os.path.join(BASE_DIR, "affix_rules.json")
+
+# Everything derived from the dictionary and affix files, rebuilt together on reload
+Lexicon = namedtuple("Lexicon", ["entries", "valid_words", "index", "headwords", "affix_rules", "morphology"])
+
+def load_lexicon(dictionary_path, affix_rules_path):
+    with open(dictionary_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    valid_words = set(entry["word"].lower() for entry in entries)
+
+    # First entry wins for each headword, matching the old linear scan
+    index = {}
+    for entry in entries:
+        index.setdefault(entry["word"].lower(), entry)
+    headwords = [entry["word"] for entry in entries]
+
+    # Affix rules compiled once per version; shared with affix_utils
+    affix_rules = load_affix_rules(affix_rules_path)
+    morphology = MorphologicalAnalyzer(affix_rules, valid_words)
+    return Lexicon(entries, valid_words, index, headwords, affix_rules, morphology)
+
+RESOURCES.register("lexicon", [DICTIONARY_PATH, AFFIX_RULES_PATH], load_lexicon)
+
+def _lexicon():
+    return RESOURCES.get("lexicon")
+
+# Module-level names kept for importers; they follow the current resource version
+TAGALOG_DICT = CurrentResource(RESOURCES, "lexicon", "entries")
+VALID_WORDS = CurrentResource(RESOURCES, "lexicon", "valid_words")
+AFFIX_RULES = CurrentResource(RESOURCES, "lexicon", "affix_rules")
+MORPHOLOGY = CurrentResource(RESOURCES, "lexicon", "morphology")
 
 # POS pattern
 TYPE_PATTERN = re.compile(r"(n\.|v\.|adj\.|gram\.|intrj\.|prep\.|adv\.)\s*(.*)", re.IGNORECASE)
@@ -21,13 +58,47 @@ TYPE_MAP = {
     "adv": "adverb"
 }
 
-# Common verb affixes for inference
-VERB_PREFIXES = ["mag", "nag", "um", "ma", "ka"]
-VERB_SUFFIXES = ["in", "an", "i"]
-
 # Known markers/particles not to treat as verbs
 MARKERS = ["si", "sina", "ang", "mga", "ay", "ng", "ni", "nina", "sa", "kayo", "ako"]
 
+def _parse_definition(definition):
+    definition = definition.strip()
+    # Search POS anywhere in definition
+    m = TYPE_PATTERN.search(definition)
+    if m:
+        code = m.group(1).replace(".", "").lower()
+        return m.group(2).strip(), TYPE_MAP.get(code, "unknown")
+    return definition, "unknown"
+
+def lookup_exact(word):
+    entry = _lexicon().index.get(word.lower())
+    if entry:
+        meaning, word_type = _parse_definition(entry["definition"])
+        return {"definition": meaning, "type": word_type, "suggested_word": None, "corrected": False}
+    return None
+
+def suggest_close_match(word):
+    """Definition source for words missing from tagalog_dictionary.json."""
+    lexicon = _lexicon()
+    closest = difflib.get_close_matches(word.lower(), lexicon.headwords, n=1, cutoff=0.8)
+    if closest:
+        entry = lexicon.index[closest[0].lower()]
+        meaning, word_type = _parse_definition(entry["definition"])
+        return {"definition": meaning, "type": word_type, "suggested_word": closest[0], "corrected": True}
+    return None
+
+# Exact headwords are an O(1) index hit; everything else goes through the
+# in-memory tier, then dictionary_cache.json, then the source. Swap
+# DEFINITION_CACHE.source to put another lookup (e.g. a Wiktionary mock) behind it.
+DEFINITION_CACHE = DefinitionCache(suggest_close_match, path=os.path.join(BASE_DIR, "dictionary_cache.json"),
+                                   version=lambda: RESOURCES.fingerprint("lexicon"))
+
+@RESOURCES.on_swap
+def _drop_stale_suggestions(old, new, changed):
+    # Cached suggestions were matched against the old headwords
+    if "lexicon" in changed:
+        DEFINITION_CACHE.reset(new.entries["lexicon"].fingerprint)
+
 def get_meaning_and_type(word):
     word_lower = word.lower()
     meaning = "No definition found."
@@ -37,67 +108,23 @@ def get_meaning_and_type(word):
     affix = None
     affix_explanation = None
 
-    # --- Exact dictionary match ---
-    matches = [entry for entry in TAGALOG_DICT if entry["word"].lower() == word_lower]
-    if matches:
-        entry = matches[0]
-        definition = entry["definition"].strip()
-        # Search POS anywhere in definition
-        m = TYPE_PATTERN.search(definition)
-        if m:
-            code = m.group(1).replace(".", "").lower()
-            word_type = TYPE_MAP.get(code, "unknown")
-            meaning = m.group(2).strip()
-        else:
-            word_type = "unknown"
-            meaning = definition
-    else:
-        # --- Auto-correct suggestion ---
-        candidates = [entry["word"] for entry in TAGALOG_DICT]
-        closest = difflib.get_close_matches(word, candidates, n=1, cutoff=0.8)
-        if closest:
-            suggested_word = closest[0]
+    # --- Exact dictionary match, else cached auto-correct suggestion ---
+    record = lookup_exact(word) or DEFINITION_CACHE.get(word)
+    if record:
+        meaning = record["definition"]
+        word_type = record["type"]
+        if record["corrected"]:
+            suggested_word = record["suggested_word"]
             corrected = True
-            matches = [entry for entry in TAGALOG_DICT if entry["word"] == suggested_word]
-            if matches:
-                entry = matches[0]
-                definition = entry["definition"].strip()
-                m = TYPE_PATTERN.search(definition)
-                if m:
-                    code = m.group(1).replace(".", "").lower()
-                    word_type = TYPE_MAP.get(code, "unknown")
-                    meaning = m.group(2).strip()
-                else:
-                    word_type = "unknown"
-                    meaning = definition
 
     # --- Infer verb type from affix ONLY if unknown and not a marker ---
     if word_type == "unknown" and word_lower not in MARKERS:
-        inferred = False
-        for prefix in VERB_PREFIXES:
-            if word_lower.startswith(prefix):
-                word_type = "verb"
-                inferred = True
-                affix = prefix
-                break
-        if not inferred:
-            for suffix in VERB_SUFFIXES:
-                if word_lower.endswith(suffix):
-                    word_type = "verb"
-                    inferred = True
-                    affix = suffix
-                    break
-        if inferred:
-            # Simple affix explanation (can be extended)
-            if affix in ["mag", "nag"]:
-                affix_explanation = "Actor focus; indicates progressive/future tense."
-            elif affix == "um":
-                affix_explanation = "Actor focus; often indicates completed or recent action."
-            elif affix == "ma":
-                affix_explanation = "Stative verbs or adjectives; describes a state or condition."
-            elif affix == "ka":
-                affix_explanation = "Reciprocal or collective focus."
-            elif affix in ["in", "an", "i"]:
-                affix_explanation = "Object or locative focus; indicates completed or imperative aspect."
+        # Only decompositions onto a known root count, as in affix_utils
+        decomposition = MORPHOLOGY.best(word_lower, require_known=True)
+        if decomposition:
+            word_type = "verb"
+            affix = decomposition.affix
+            if affix:
+                affix_explanation, _ = MORPHOLOGY.explain(affix)
 
     return meaning, word_type, suggested_word, corrected, affix, affix_explanation
@@ -1,9 +1,12 @@
 import re
-from dictionary_utils import get_meaning_and_type, MARKERS
+from dictionary_utils import get_meaning_and_type, MARKERS, MORPHOLOGY
+
+WORD_PATTERN = re.compile(r"\b[\w-]+\b")
 
 # --- Analyze a single word ---
 def analyze_word(word):
     meaning, word_type, suggested_word, corrected, affix, affix_explanation = get_meaning_and_type(word)
+    morph = MORPHOLOGY.best(word) if word_type == "verb" else None
     return {
         "word": word,
         "type": word_type,
@@ -11,18 +14,72 @@ def analyze_word(word):
         "suggested_word": suggested_word,
         "corrected": corrected,
         "affix": affix,
-        "affix_explanation": affix_explanation
+        "affix_explanation": affix_explanation,
+        "root": morph.root if morph else None,
+        "focus": morph.focus if morph else None,
+        "aspect": morph.aspect if morph else None
     }
 
+# --- Per-sentence analysis context ---
+class SentenceAnalysis:
+    """
+    Tokenizes a sentence once and resolves each unique word once.
+    Structure detection and the per-word details both read from the same
+    resolved table, so repeated words within a sentence cost nothing.
+    Pass a shared `resolved` dict to reuse lookups across sentences.
+
+    `sentence` may also be a Document (NLP/document.py); its word spans are
+    used as-is and annotated in place instead of tokenizing again.
+    """
+
+    def __init__(self, sentence, resolved=None):
+        if hasattr(sentence, "words"):
+            self.doc = sentence
+            self.sentence = sentence.text
+            self.spans = [(w.text, w.start, w.end) for w in sentence.words()]
+        else:
+            self.doc = None
+            self.sentence = sentence
+            self.spans = [(m.group(), m.start(), m.end()) for m in WORD_PATTERN.finditer(sentence)]
+        self.words = [span[0] for span in self.spans]
+        self.resolved = resolved if resolved is not None else {}
+        for word in self.words:
+            if word not in self.resolved:
+                self.resolved[word] = analyze_word(word)
+        if self.doc is not None:
+            for span in self.doc.words():
+                span.info = self.resolved[span.text]
+
+    def info(self, word):
+        return self.resolved[word]
+
+    @property
+    def types(self):
+        return [self.resolved[w]["type"] for w in self.words]
+
+    @property
+    def structure(self):
+        structure = classify_structure(self.types)
+        if self.doc is not None:
+            self.doc.annotations["structure"] = structure
+        return structure
+
+    def word_details(self):
+        # Fresh dicts per position so callers can annotate them freely
+        return [dict(self.resolved[w], start=start, end=end) for w, start, end in self.spans]
+
+    def corrected_words(self):
+        out = []
+        for word in self.words:
+            info = self.resolved[word]
+            out.append(info["suggested_word"] if info["corrected"] and info["suggested_word"] != word else word)
+        return out
+
 # --- Detect sentence structure ---
-def detect_sentence_structure(sentence):
-    words = re.findall(r"\b[\w-]+\b", sentence)
-    if not words:
+def classify_structure(types):
+    if not types:
         return "Unknown pattern"
 
-    analyzed = [analyze_word(w) for w in words]
-    types = [w["type"] for w in analyzed]
-
     # Basic pattern rules
     pattern = []
     first_noun_found = False
@@ -53,3 +110,63 @@ def detect_sentence_structure(sentence):
         return "SVO (Subject-Verb-Object)"
     else:
         return "Unknown pattern"
+
+def detect_sentence_structure(sentence):
+    return SentenceAnalysis(sentence).structure
+
+# --- Analysis of a correction's stages ---
+# Pipeline outputs that are analyzed besides the input (bridge is English)
+ANALYZED_STAGES = ("cleaned", "final")
+
+def analyze_correction(report, resolved=None):
+    """
+    Structure and per-word analysis of a corrector report: the input,
+    over the pipeline's own Document so it is not tokenized again, and the
+    spelling-corrected and final outputs. All of them share one `resolved`
+    table, so a word that survives correction is looked up once, and a
+    stage identical to an earlier one reuses its analysis.
+    """
+    resolved = resolved if resolved is not None else {}
+    doc = report["document"]
+    original = SentenceAnalysis(doc, resolved)
+    analysis = {"original": {"text": doc.text, "structure": original.structure,
+                             "words": original.word_details()}}
+    by_text = {doc.text: analysis["original"]}
+    for stage in ANALYZED_STAGES:
+        text = " ".join(r["stages"][stage] for r in report["sentences"] if r["stages"][stage])
+        if text not in by_text:
+            stage_analysis = SentenceAnalysis(text, resolved)
+            by_text[text] = {"text": text, "structure": stage_analysis.structure,
+                             "words": stage_analysis.word_details()}
+        analysis[stage] = by_text[text]
+    return analysis
+
+# --- Batch analysis ---
+def analyze_batch(sentences, resolved=None):
+    """
+    Analyzes many sentences in one pass. Repeated sentences are analyzed
+    once and every unique word across the batch is resolved once. Results
+    come back in input order; a bad item gets an "error" entry instead of
+    failing the whole batch.
+    """
+    resolved = resolved if resolved is not None else {}
+    seen = {}
+    results = []
+
+    for sentence in sentences:
+        key = sentence.strip() if isinstance(sentence, str) else None
+        if key and key in seen:
+            results.append(seen[key])
+            continue
+        try:
+            if not key:
+                raise ValueError("No sentence provided")
+            analysis = SentenceAnalysis(key, resolved)
+            item = {"sentence": key, "structure": analysis.structure, "words": analysis.word_details()}
+        except Exception as e:
+            item = {"sentence": sentence, "error": str(e)}
+        if key:
+            seen[key] = item
+        results.append(item)
+
+    return results
@@ -0,0 +1,200 @@
+import json
+from collections import namedtuple
+from functools import lru_cache
+
+VOWELS = set("aeiou")
+_END = "$"
+
+# affixes: every affix key that was stripped, outermost first
+Decomposition = namedtuple(
+    "Decomposition",
+    ["root", "affix", "focus", "aspect", "affixes", "reduplicated", "known"]
+)
+
+def load_affix_rules(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _build_trie(forms):
+    trie = {}
+    for form, key in forms:
+        node = trie
+        for ch in form:
+            node = node.setdefault(ch, {})
+        node[_END] = key
+    return trie
+
+def _walk(trie, chars):
+    """All (length, affix) matches of `trie` along `chars`, including the empty match."""
+    matches = [(0, None)]
+    node = trie
+    for i, ch in enumerate(chars):
+        node = node.get(ch)
+        if node is None:
+            break
+        if _END in node:
+            matches.append((i + 1, node[_END]))
+    return matches
+
+def _onset(stem):
+    i = 0
+    while i < len(stem) and stem[i] not in VOWELS:
+        i += 1
+    return i
+
+class MorphologicalAnalyzer:
+    """
+    Decomposes Filipino verb forms into (root, affix, focus, aspect).
+
+    affix_rules.json is compiled into a prefix trie and a reversed suffix
+    trie, so all prefix and suffix matches come out of one walk from each
+    end of the word. The remaining stem is checked for an -um-/-in- infix
+    (after the first consonant cluster, or word-initial before a vowel) and
+    for CV reduplication. Every candidate root is checked against the
+    lexicon, and results are memoized per word.
+
+    Aspect follows the usual realis/reduplication grid: realis affixes
+    (nag-, na-, and any infix) give completed, or progressive when
+    reduplicated; the rest give infinitive, or contemplative when
+    reduplicated.
+
+    An infix may follow a prefix marked "takes_infix" (i+s-in-ulat).
+    "infixed_forms" spell a prefix with an infix already inside it
+    (ipinag- for ipag- + -in-), and "infix_forms" spell an infix as a
+    prefix (ni+linis for -in-).
+    """
+
+    def __init__(self, rules, lexicon, min_root=2, cache_size=50000):
+        self.rules = rules
+        self.lexicon = lexicon
+        self.min_root = min_root
+
+        # Prefix trie values are (prefix key, infix key) pairs
+        prefixes, suffixes, infixes = [], [], []
+        for key, rule in rules.items():
+            positions = rule.get("position", [])
+            forms = rule.get("forms", [key])
+            if "prefix" in positions:
+                prefixes.extend((f, (key, None)) for f in forms)
+                prefixes.extend((f, (key, infix)) for f, infix in rule.get("infixed_forms", {}).items())
+            if "suffix" in positions:
+                suffixes.extend((f[::-1], key) for f in forms)
+            if "infix" in positions:
+                infixes.append((key, key))
+                prefixes.extend((f, (None, key)) for f in rule.get("infix_forms", []))
+
+        self._prefix_trie = _build_trie(prefixes)
+        self._suffix_trie = _build_trie(suffixes)
+        self._infixes = infixes
+        self._infix_keys = {key for key, _ in infixes}
+        self.analyze = lru_cache(maxsize=cache_size)(self._analyze)
+
+    def clear_cache(self):
+        self.analyze.cache_clear()
+
+    # --- Stem-internal morphology ---
+    def _strip_infix(self, stem):
+        yield stem, None
+        onset = _onset(stem)
+        for form, key in self._infixes:
+            end = onset + len(form)
+            if stem[onset:end] != form or len(stem) - len(form) < self.min_root:
+                continue
+            # Vowel-initial roots take the infix as a prefix (um+alis, in+alis)
+            if onset == 0 and (end >= len(stem) or stem[end] not in VOWELS):
+                continue
+            yield stem[:onset] + stem[end:], key
+
+    def _strip_redup(self, stem):
+        yield stem, False
+        onset = _onset(stem)
+        if onset >= len(stem):
+            return
+        syllable = stem[:onset + 1]
+        rest = stem[len(syllable):]
+        if rest.startswith(syllable) and len(rest) >= self.min_root:
+            yield rest, True
+
+    # --- Classification ---
+    def _focus_and_affix(self, prefix, infix, suffix):
+        # Suffixes decide focus, then an object infix, then the prefix; a
+        # prefix built around the infix (ipinag-) keeps its own focus
+        hosts_infix = bool(prefix and self.rules.get(prefix, {}).get("infixed_forms"))
+        for key in (suffix, prefix if hosts_infix else None, "in" if infix == "in" else None, prefix, infix):
+            if key:
+                return self.rules.get(key, {}).get("focus"), key
+        return None, None
+
+    def _aspect(self, prefix, infix, reduplicated):
+        realis = bool(infix) or bool(prefix and self.rules.get(prefix, {}).get("realis"))
+        if realis:
+            return "progressive" if reduplicated else "completed"
+        return "contemplative" if reduplicated else "infinitive"
+
+    def _analyze(self, word):
+        word = word.lower()
+        results = []
+        seen = set()
+        prefix_matches = _walk(self._prefix_trie, word)
+        suffix_matches = _walk(self._suffix_trie, reversed(word))
+
+        for p_len, matched in prefix_matches:
+            prefix, prefix_infix = matched or (None, None)
+            for s_len, suffix in suffix_matches:
+                stem = word[p_len:len(word) - s_len]
+                if len(stem) < self.min_root or stem.startswith("-"):
+                    continue
+                # Infixes attach to the bare stem, or after a prefix that takes one (i-)
+                if prefix_infix:
+                    infix_options = [(stem, prefix_infix)]
+                elif not prefix or self.rules.get(prefix, {}).get("takes_infix"):
+                    infix_options = self._strip_infix(stem)
+                else:
+                    infix_options = [(stem, None)]
+                for infixed, infix in infix_options:
+                    for root, redup in self._strip_redup(infixed):
+                        if not (prefix or suffix or infix or redup):
+                            continue
+                        key = (root, prefix, infix, suffix, redup)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        focus, affix = self._focus_and_affix(prefix, infix, suffix)
+                        results.append(Decomposition(
+                            root=root,
+                            affix=affix,
+                            focus=focus,
+                            aspect=self._aspect(prefix, infix, redup),
+                            affixes=tuple(a for a in (prefix, infix, suffix) if a),
+                            reduplicated=redup,
+                            known=root in self.lexicon,
+                        ))
+
+        # Lexicon-verified first, then roots not split at a hyphen, then the
+        # longest root (fewest stripped letters)
+        results.sort(key=lambda d: (not d.known, "-" in d.root, -len(d.root)))
+        return tuple(results)
+
+    def _plausible(self, d, min_structural_root):
+        # Reduplication alone (lolo, kaka) and a lone one- or two-letter
+        # affix (i+log, na+nay) match too many plain nouns and pronouns,
+        # so those parses need a known root of a real length
+        if not d.affix:
+            return d.reduplicated and d.known and len(d.root) >= min_structural_root + 1
+        if d.affixes == (d.affix,) and len(d.affix) <= 2 and d.affix not in self._infix_keys:
+            return d.known and len(d.root) >= min_structural_root + 1
+        return True
+
+    def best(self, word, require_known=False, min_structural_root=3):
+        for d in self.analyze(word.lower()):
+            if not self._plausible(d, min_structural_root):
+                continue
+            if d.known:
+                return d
+            if not require_known and len(d.root) >= min_structural_root:
+                return d
+        return None
+
+    def explain(self, affix):
+        data = self.rules.get(affix, {})
+        return data.get("explanation", ""), data.get("note", "")
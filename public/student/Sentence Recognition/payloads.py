@@ -0,0 +1,61 @@
+"""
+Response payloads of the /analyze and /correct endpoints, shared by
+server.py and the replay tool's lib target (NLP/traffic_replay.py), so
+a library replay answers exactly what the server would.
+"""
+from filipino_rules import SentenceAnalysis, analyze_batch, analyze_correction
+from document import Document
+
+def format_word_details(word_details):
+    for info in word_details:
+        info['meaning'] = info['meaning'] if info['meaning'] else "No meaning found"
+        info['type'] = info['type'] if info['type'] else "Unknown"
+    return word_details
+
+def analysis_payload(sentence, structure, words):
+    return {
+        "original": sentence,
+        "corrected": sentence,
+        "structure": structure,
+        "words": format_word_details(words)
+    }
+
+def analyze_payload(sentence):
+    """/analyze: structure and word details of one sentence."""
+    analysis = SentenceAnalysis(Document(sentence))
+    return analysis_payload(sentence, analysis.structure, analysis.word_details())
+
+def batch_payloads(sentences):
+    """/analyze/batch results, in input order; a bad item gets an "error" entry."""
+    results = []
+    for item in analyze_batch(sentences):
+        if "error" in item:
+            results.append({"original": item["sentence"], "error": item["error"]})
+        else:
+            results.append(analysis_payload(item["sentence"], item["structure"], item["words"]))
+    return results
+
+def stage_analysis(report):
+    """Analysis of the input, cleaned and final text of a correction, sharing one word table."""
+    analysis = analyze_correction(report)
+    for stage in analysis.values():
+        format_word_details(stage["words"])
+    return analysis
+
+def correction_payload(sentence, report):
+    """/correct: the corrected text and what the latency budget cost."""
+    return {
+        "original": sentence,
+        "corrected": report["corrected"],
+        "degradation": report["degradation"],
+        "elapsed_ms": report["elapsed_ms"],
+        "edits": report["edits"]
+    }
+
+def correct_analyze_payload(sentence, report):
+    """/correct/analyze: like correction_payload, with every stage output and its analysis."""
+    payload = correction_payload(sentence, report)
+    payload["sentences"] = [{"text": r["text"], "corrected": r["corrected"], "stages": r["stages"]}
+                            for r in report["sentences"]]
+    payload["analysis"] = stage_analysis(report)
+    return payload
@@ -1,26 +1,18 @@
 # sentence_explainer.py
-import re
-from filipino_rules import analyze_word, detect_sentence_structure
-from dictionary_utils import get_meaning_and_type
+from filipino_rules import SentenceAnalysis
 
-def analyze_sentence(sentence):
-    words = re.findall(r"\b[\w-]+\b", sentence)
-    suggested_corrections = []
-
-    for word in words:
-        meaning, word_type, suggested_word, corrected, affix, affix_explanation = get_meaning_and_type(word)
-        if corrected and suggested_word != word:
-            suggested_corrections.append((word, suggested_word))
+def analyze_sentence(sentence, resolved=None):
+    # Share one lookup table between the raw and corrected passes
+    resolved = resolved if resolved is not None else {}
+    original = SentenceAnalysis(sentence, resolved)
 
     # Auto-apply corrections for simplicity
-    corrected_words = [suggested_word if any(w == orig for orig, sugg in suggested_corrections) else w for w in words]
-    corrected_sentence = " ".join(corrected_words)
+    corrected_sentence = " ".join(original.corrected_words())
 
-    structure = detect_sentence_structure(corrected_sentence)
+    analysis = SentenceAnalysis(corrected_sentence, resolved)
     word_analysis = []
 
-    for word in corrected_sentence.split():
-        info = analyze_word(word)
+    for info in analysis.word_details():
         word_analysis.append({
             "word": info['word'],
             "type": info['type'],
@@ -34,6 +26,6 @@ def analyze_sentence(sentence):
     return {
         "original_sentence": sentence,
         "corrected_sentence": corrected_sentence if corrected_sentence != sentence else None,
-        "structure": structure,
+        "structure": analysis.structure,
         "words": word_analysis
     }
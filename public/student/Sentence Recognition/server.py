@@ -4,6 +4,7 @@ import re
 import sys
 import os
 import logging
+import argparse
 import nltk
 
 # Auto-download required NLTK data
@@ -26,8 +27,20 @@ if nlp_path not in sys.path:
 # --- NLP Imports ---
 try:
     from filipino_grammar_corrector import FilipinoGrammarCorrector
-    from filipino_rules import analyze_word, detect_sentence_structure
-    from dictionary_utils import get_meaning_and_type
+    from serving import (ServerBusy, install_error_handlers, install_priority_lanes, lane,
+                         request_budget_ms, serve)
+    from profiling import install_profiling
+    from traffic_capture import install_traffic_capture
+    from model_registry import REGISTRY
+    from http_cache import (sentence_etag, request_json, request_sentence, is_not_modified, cacheable,
+                            not_modified, fingerprint_values, ResultCache, normalize_sentence)
+    from resources import RESOURCES, install_resource_reload, is_admin
+    import memory_report
+    from sessions import SessionStore, correct_in_session, share_sentence_results
+    from payloads import (analyze_payload, batch_payloads, correction_payload,
+                          correct_analyze_payload, stage_analysis)
+    from dictionary_utils import DEFINITION_CACHE
+    import warmup
 except ImportError as e:
     logger.critical(f"Failed to import NLP modules. Error: {e}")
     sys.exit(1)
@@ -35,6 +48,11 @@ except ImportError as e:
 app = Flask(__name__)
 # Enhanced CORS to handle pre-flight OPTIONS requests
 CORS(app, resources={r"/*": {"origins": "*"}})
+install_error_handlers(app)  # ServerBusy -> 503 + Retry-After
+install_priority_lanes(app)  # X-Priority: bulk queues behind interactive requests
+install_profiling(app)  # opt-in: UBIGKAS_PROFILE_TOKEN / UBIGKAS_PROFILE_SAMPLE_RATE
+install_resource_reload(app)  # lexicon reloads: POST /resources/reload with UBIGKAS_ADMIN_TOKEN
+install_traffic_capture(app)  # opt-in: UBIGKAS_CAPTURE_SAMPLE_RATE, replay with traffic_replay.py
 
 # --- Initialize AI Models ---
 logger.info("Initializing New Transformer-Based Filipino Grammar Corrector...")
@@ -46,65 +64,293 @@ try:
     corrector = FilipinoGrammarCorrector(
         tl_en_model=tl_en_model_path,
         en_tl_model=en_tl_model_path,
-        spelling_model_path=spelling_model_path
+        spelling_model_path=spelling_model_path,
+        # Server-wide latency SLO for /correct; requests may pass their own budget_ms
+        default_budget_ms=float(os.environ.get("UBIGKAS_CORRECT_BUDGET_MS", 0)) or None
     )
-    logger.info("AI Models loaded successfully!")
+    logger.info("AI Models registered (loaded on first use).")
 except Exception as e:
     logger.critical(f"Failed to initialize AI models: {e}")
     sys.exit(1)
 
-@app.route("/analyze", methods=["POST", "OPTIONS"])
+# --- Response cache keys ---
+# Anything that can change an answer goes into the ETag: the build, the model
+# checkpoints and the lexicon/rule files (RESOURCES.version, which changes on reload).
+BUILD_VERSION = os.environ.get("UBIGKAS_BUILD", "dev")
+# Checkpoint contents, not paths, so a retrained model or new Hub revision changes it
+MODEL_VERSION = fingerprint_values(BUILD_VERSION, REGISTRY.fingerprint())
+logger.info(f"Model version {MODEL_VERSION}")
+
+# Finished payloads keyed by ETag, so repeats skip the work even without a client cache
+ANALYZE_RESULTS = ResultCache()
+CORRECT_RESULTS = ResultCache()
+
+# Upper bound on sentences per /analyze/batch request
+MAX_BATCH_SIZE = 1000
+
+# Last corrected draft per editing session (/correct/session)
+SESSIONS = SessionStore()
+
+# Server-side state in the /memory report, next to models and lexicons
+memory_report.track("caches", "analyze_results", lambda: ANALYZE_RESULTS)
+memory_report.track("caches", "correct_results", lambda: CORRECT_RESULTS)
+memory_report.track("caches", "sessions", lambda: SESSIONS)
+memory_report.track("caches", "definitions", lambda: DEFINITION_CACHE)
+
+@RESOURCES.on_swap
+def _drop_stale_results(old, new, changed):
+    # Old entries sit under old-version ETags and would only take up room;
+    # session results would be reused as-is, so they must go
+    ANALYZE_RESULTS.clear()
+    CORRECT_RESULTS.clear()
+    SESSIONS.clear()
+
+def analyze_etag(sentence):
+    return sentence_etag("analyze", sentence, BUILD_VERSION, RESOURCES.version)
+
+def correct_etag(sentence):
+    return sentence_etag("correct", sentence, MODEL_VERSION, RESOURCES.version)
+
+def correct_analyze_etag(sentence):
+    return sentence_etag("correct_analyze", sentence, BUILD_VERSION, MODEL_VERSION, RESOURCES.version)
+
+def sentence_result_key(sentence):
+    # Per-sentence corrector results, shared by sessions, /correct and warm-up
+    return sentence_etag("correct_sentence", sentence, MODEL_VERSION, RESOURCES.version)
+
+def cached_analysis(sentence):
+    etag = analyze_etag(sentence)
+    payload = ANALYZE_RESULTS.get(etag)
+    if payload is None:
+        payload = analyze_payload(sentence)
+        ANALYZE_RESULTS.put(etag, payload)
+    return etag, payload
+
+def cached_correction(sentence, budget_ms=None):
+    """Returns (etag, payload, full_quality); only full-quality answers are cached."""
+    etag = correct_etag(sentence)
+    payload = CORRECT_RESULTS.get(etag)
+    if payload is not None:
+        return etag, payload, True
+
+    report = corrector.correct_with_report(sentence, budget_ms=budget_ms)
+    payload = correction_payload(sentence, report)
+    full_quality = report["degradation"] == "full"
+    if full_quality:
+        CORRECT_RESULTS.put(etag, payload)
+    share_sentence_results(report, CORRECT_RESULTS, sentence_result_key)
+    return etag, payload, full_quality
+
+def cached_correct_analysis(sentence, budget_ms=None):
+    """Like cached_correction, with every stage output and its analysis in the payload."""
+    etag = correct_analyze_etag(sentence)
+    payload = CORRECT_RESULTS.get(etag)
+    if payload is not None:
+        return etag, payload, True
+
+    report = corrector.correct_with_report(sentence, budget_ms=budget_ms)
+    payload = correct_analyze_payload(sentence, report)
+    full_quality = report["degradation"] == "full"
+    if full_quality:
+        CORRECT_RESULTS.put(etag, payload)
+    share_sentence_results(report, CORRECT_RESULTS, sentence_result_key)
+    return etag, payload, full_quality
+
+def session_request():
+    """(text, session_id, error) from a session POST body."""
+    data = request_json()
+    if data is None:
+        return None, None, "Request body must be a JSON object"
+    text = data.get("text", data.get("sentence", ""))
+    text = normalize_sentence(text) if isinstance(text, str) else ""
+    if not text:
+        return None, None, "No sentence provided"
+    session_id = data.get("session_id")
+    if session_id is not None and (not isinstance(session_id, str) or not 0 < len(session_id) <= 64):
+        return None, None, "Invalid session_id"
+    return text, session_id, None
+
+def cache_analyses(payloads):
+    """Stores batch results under each sentence's /analyze key, so a later /analyze is a hit."""
+    for payload in payloads:
+        sentence = payload["original"]
+        # /analyze answers with the normalized sentence, so only store results that match it
+        if "error" not in payload and isinstance(sentence, str) and sentence == normalize_sentence(sentence):
+            ANALYZE_RESULTS.put(analyze_etag(sentence), payload)
+    return payloads
+
+def warm_analysis(sentences):
+    """Batch-analyzes sentences and stores each result under its /analyze key."""
+    cache_analyses(batch_payloads(sentences))
+
+def warm_correction(sentence):
+    # Warm-up only uses model capacity that students leave idle
+    with lane("bulk"):
+        cached_correction(sentence)
+
+@app.route("/analyze", methods=["GET", "POST", "OPTIONS"])
 def analyze_sentence():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
         
-    data = request.get_json()
-    sentence = data.get("sentence", "").strip()
+    sentence = request_sentence()
     if not sentence:
         return jsonify({"error": "No sentence provided"}), 400
 
+    etag = analyze_etag(sentence)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
     try:
-        structure = detect_sentence_structure(sentence)
-        raw_words = re.findall(r"\b[\w-]+\b", sentence)
-        word_details = []
-        
-        for word in raw_words:
-            meaning, word_type, _, _, _, _ = get_meaning_and_type(word)
-            info = analyze_word(word)
-            info['word'] = word
-            info['meaning'] = meaning if meaning else "No meaning found"
-            info['type'] = word_type if word_type else "Unknown"
-            word_details.append(info)
-
-        return jsonify({
-            "original": sentence,
-            "corrected": sentence,
-            "structure": structure,
-            "words": word_details
-        })
+        etag, payload = cached_analysis(sentence)
+        return cacheable(jsonify(payload), etag)
     except Exception as e:
         logger.error(f"Analysis Error: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/correct", methods=["POST", "OPTIONS"])
+@app.route("/analyze/batch", methods=["POST", "OPTIONS"])
+def analyze_sentences_batch():
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    data = request_json()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    sentences = data.get("sentences")
+    if not isinstance(sentences, list) or not sentences:
+        return jsonify({"error": "No sentences provided"}), 400
+    if len(sentences) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE} sentences)"}), 413
+
+    try:
+        return jsonify({"results": cache_analyses(batch_payloads(sentences))})
+    except Exception as e:
+        logger.error(f"Batch Analysis Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/correct", methods=["GET", "POST", "OPTIONS"])
 def correct_sentence():
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"}), 200
 
-    data = request.get_json()
-    sentence = data.get("sentence", "").strip()
+    sentence = request_sentence()
     if not sentence:
         return jsonify({"error": "No sentence provided"}), 400
 
+    etag = correct_etag(sentence)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
     try:
-        corrected_text = corrector.correct_grammar_with_pipeline(sentence)
-        return jsonify({
-            "original": sentence,
-            "corrected": corrected_text
-        })
+        etag, payload, full_quality = cached_correction(sentence, budget_ms=request_budget_ms())
+        response = jsonify(payload)
+        # Only full-quality answers may be reused by caches
+        if not full_quality:
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        return cacheable(response, etag)
+    except ServerBusy:
+        raise
     except Exception as e:
         logger.error(f"Correction Error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/models", methods=["GET"])
+def model_status():
+    # Models load on the first /correct; analyze-only traffic never loads any
+    return jsonify(REGISTRY.report())
+
+@app.route("/memory", methods=["GET"])
+def memory_status():
+    # Resident memory by component; `python memory_report.py --check` gates deploys on it.
+    # Admin-only like /resources/reload: it walks every cache and describes the deployment
+    if not is_admin(request):
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(memory_report.memory_report())
+
+@app.route("/stages", methods=["GET"])
+def stage_status():
+    # In-flight and queued requests per model stage and lane
+    return jsonify({name: limiter.stats() for name, limiter in corrector.stage_limits.items()})
+
+@app.route("/correct/session", methods=["POST", "OPTIONS"])
+def correct_session():
+    # Resubmitted drafts: only sentences changed since the last call are re-run
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    text, session_id, error = session_request()
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        response = jsonify(correct_in_session(corrector, SESSIONS, session_id, text,
+                                              budget_ms=request_budget_ms(),
+                                              results=CORRECT_RESULTS, result_key=sentence_result_key))
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    except ServerBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Session Correction Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/correct/analyze", methods=["GET", "POST", "OPTIONS"])
+def correct_and_analyze():
+    # /correct + /analyze in one pass: all stage outputs, and the input, cleaned
+    # and final text analyzed off the pipeline's own tokens. A POST with a
+    # session_id goes through the correction session like /correct/session.
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"}), 200
+
+    data = request_json() if request.method == "POST" else {}
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    try:
+        if data.get("session_id") is not None:
+            text, session_id, error = session_request()
+            if error:
+                return jsonify({"error": error}), 400
+            response = jsonify(correct_in_session(corrector, SESSIONS, session_id, text,
+                                                  budget_ms=request_budget_ms(), analyze=stage_analysis,
+                                                  results=CORRECT_RESULTS, result_key=sentence_result_key))
+            response.headers["Cache-Control"] = "no-store"
+            return response
+
+        sentence = request_sentence()
+        if not sentence:
+            return jsonify({"error": "No sentence provided"}), 400
+        etag = correct_analyze_etag(sentence)
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        etag, payload, full_quality = cached_correct_analysis(sentence, budget_ms=request_budget_ms())
+        response = jsonify(payload)
+        if not full_quality:
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        return cacheable(response, etag)
+    except ServerBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Correct+Analyze Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# --- Quiz cache warm-up ---
+# UBIGKAS_WARMUP=1 fills the result caches from the assessment question banks in
+# the background, so the first quiz requests after a deploy hit warm entries.
+if os.environ.get("UBIGKAS_WARMUP") == "1":
+    warmup.start_background(warm_analysis, warm_correction)
+
 if __name__ == "__main__":
-    app.run(debug=True, port=5000, use_reloader=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="UBigkas Sentence Recognition server")
+    parser.add_argument("--production", action="store_true", help="Serve with waitress instead of the Flask dev server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.production:
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    else:
+        app.run(debug=True, port=args.port, use_reloader=False)
@@ -0,0 +1,144 @@
+"""
+Pre-warms the analysis and correction caches with every sentence and answer
+option from the assessment question banks.
+
+    python warmup.py                          # fill dictionary_cache.json locally (deploy step)
+    python warmup.py --url http://host:5000   # drive a running server (and any proxy in front)
+
+The server runs the same job in the background at startup when UBIGKAS_WARMUP=1.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+ASSESSMENT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assessment'))
+QUESTION_BANKS = [
+    os.path.join(ASSESSMENT_DIR, name) for name in (
+        "affix_questions.json",
+        "pronoun_questions.json",
+        "sentence_structure.json",
+        "panguri_questions.json",
+    )
+]
+BATCH_SIZE = 200
+
+def extract_sentences(paths=QUESTION_BANKS):
+    """Unique wrong sentences, options and correct answers, in file order."""
+    seen = set()
+    sentences = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                questions = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping question bank {path}: {e}")
+            continue
+        for question in questions:
+            candidates = [question.get("wrongSentence"), question.get("correctOption")]
+            candidates.extend(question.get("options") or [])
+            for text in candidates:
+                if isinstance(text, str) and text.strip() and text.strip() not in seen:
+                    seen.add(text.strip())
+                    sentences.append(text.strip())
+    return sentences
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def warm(sentences, analyze_many, correct_one=None, stop=None):
+    """
+    Runs `analyze_many` over the sentences in batches, then `correct_one`
+    per sentence. A correction that fails (e.g. the server is busy) is
+    logged and skipped; the entry will simply be computed on first use.
+    """
+    started = time.perf_counter()
+    analyzed = corrected = failed = 0
+
+    for chunk in _chunks(sentences, BATCH_SIZE):
+        if stop is not None and stop.is_set():
+            break
+        analyze_many(chunk)
+        analyzed += len(chunk)
+
+    if correct_one is not None:
+        for sentence in sentences:
+            if stop is not None and stop.is_set():
+                break
+            try:
+                correct_one(sentence)
+                corrected += 1
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Warm-up correction failed for {sentence!r}: {e}")
+
+    stats = {
+        "sentences": len(sentences),
+        "analyzed": analyzed,
+        "corrected": corrected,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info(f"Cache warm-up finished: {stats}")
+    return stats
+
+def start_background(analyze_many, correct_one=None, paths=QUESTION_BANKS):
+    """Warms caches on a daemon thread so startup is not delayed."""
+    thread = threading.Thread(
+        target=lambda: warm(extract_sentences(paths), analyze_many, correct_one),
+        name="cache-warmup",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+# --- Remote mode: warm a running server over HTTP ---
+def _post_json(url, payload, timeout):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.load(resp)
+
+def warm_server(base_url, sentences, correct=True, timeout=120):
+    base_url = base_url.rstrip("/")
+
+    def analyze_many(chunk):
+        # One batch pass fills the server's /analyze cache; the GETs then only
+        # hit it, warming browsers and proxies, which cache the GET variants
+        _post_json(f"{base_url}/analyze/batch", {"sentences": chunk}, timeout)
+        for sentence in chunk:
+            urllib.request.urlopen(f"{base_url}/analyze?" + urllib.parse.urlencode({"sentence": sentence}),
+                                   timeout=timeout).read()
+
+    def correct_one(sentence):
+        urllib.request.urlopen(f"{base_url}/correct?" + urllib.parse.urlencode({"sentence": sentence}),
+                               timeout=timeout).read()
+
+    return warm(sentences, analyze_many, correct_one if correct else None)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm UBigkas caches from the quiz question banks")
+    parser.add_argument("--url", help="Base URL of a running server; omit to warm the local definition cache")
+    parser.add_argument("--skip-correct", action="store_true", help="Only warm /analyze")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    sentences = extract_sentences()
+    if args.url:
+        warm_server(args.url, sentences, correct=not args.skip_correct)
+    else:
+        # Local mode has no long-lived result cache; what persists is dictionary_cache.json
+        from filipino_rules import analyze_batch
+        from dictionary_utils import DEFINITION_CACHE
+        warm(sentences, analyze_batch)
+        DEFINITION_CACHE.flush()
+
+if __name__ == "__main__":
+    main()
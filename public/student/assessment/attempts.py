@@ -0,0 +1,222 @@
+import json
+import os
+import time
+from collections import namedtuple
+import numpy as np
+
+# Same skills and 0-10 weak threshold as tutor.py
+SKILLS = ['VSO', 'Pronouns', 'Affix']
+DEFAULT_THRESHOLD = 6
+
+# --------------------------
+# Event model
+# --------------------------
+AttemptEvent = namedtuple("AttemptEvent", ["student", "class_id", "skill", "score", "max_score", "timestamp"])
+
+def make_attempt(student, class_id, skill, score, max_score=10, timestamp=None):
+    if skill not in SKILLS:
+        raise ValueError(f"Unknown skill '{skill}'. Expected one of {SKILLS}")
+    return AttemptEvent(student, class_id, skill, score, max_score, timestamp or time.time())
+
+class AttemptLog:
+    """Append-only JSON-lines log of quiz attempts; the source of truth for replays."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, event):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event._asdict(), ensure_ascii=False) + "\n")
+
+    def replay(self, skip=0):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if i >= skip and line.strip():
+                    yield AttemptEvent(**json.loads(line))
+
+# --------------------------
+# Incremental aggregates
+# --------------------------
+class WeakAreaAggregator:
+    """
+    Running per-student and per-class score sums for each skill, kept in
+    columnar numpy arrays (one row per student / class, one column per
+    skill). Each attempt is an O(1) update, and the set of weak students
+    per (class, skill) is maintained as attempts arrive, so "who is weak
+    at Affix?" never rescans history. A student's history belongs to their
+    latest class: on a transfer it moves out of the old class's sums.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, capacity=1024):
+        self.threshold = threshold
+        self.events_applied = 0
+
+        self.student_ids = []
+        self._student_index = {}
+        self.class_ids = []
+        self._class_index = {}
+
+        n_skills = len(SKILLS)
+        self.sums = np.zeros((capacity, n_skills), dtype=np.float64)
+        self.counts = np.zeros((capacity, n_skills), dtype=np.int32)
+        self.class_of = np.full(capacity, -1, dtype=np.int32)
+        self.class_sums = np.zeros((16, n_skills), dtype=np.float64)
+        self.class_counts = np.zeros((16, n_skills), dtype=np.int32)
+
+        # (class row, skill column) -> set of weak student rows
+        self._weak = {}
+
+    # --- Row management ---
+    @staticmethod
+    def _grow(array, needed, fill=0):
+        if needed < len(array):
+            return array
+        grown = np.full((max(needed + 1, len(array) * 2),) + array.shape[1:], fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _class_row(self, class_id):
+        row = self._class_index.get(class_id)
+        if row is None:
+            row = len(self.class_ids)
+            self._class_index[class_id] = row
+            self.class_ids.append(class_id)
+            self.class_sums = self._grow(self.class_sums, row)
+            self.class_counts = self._grow(self.class_counts, row)
+        return row
+
+    def _student_row(self, student, class_row):
+        row = self._student_index.get(student)
+        if row is None:
+            row = len(self.student_ids)
+            self._student_index[student] = row
+            self.student_ids.append(student)
+            self.sums = self._grow(self.sums, row)
+            self.counts = self._grow(self.counts, row)
+            self.class_of = self._grow(self.class_of, row, fill=-1)
+        old_class = self.class_of[row]
+        if old_class != class_row:
+            # Student changed class: their sums and weak flags follow them, so a
+            # class's averages always cover exactly its current students
+            if old_class >= 0:
+                self.class_sums[old_class] -= self.sums[row]
+                self.class_counts[old_class] -= self.counts[row]
+                self.class_sums[class_row] += self.sums[row]
+                self.class_counts[class_row] += self.counts[row]
+            for col in range(len(SKILLS)):
+                if row in self._weak.get((old_class, col), ()):
+                    self._weak[(old_class, col)].discard(row)
+                    self._weak.setdefault((class_row, col), set()).add(row)
+            self.class_of[row] = class_row
+        return row
+
+    # --- Updates ---
+    def record(self, event):
+        col = SKILLS.index(event.skill)
+        class_row = self._class_row(event.class_id)
+        row = self._student_row(event.student, class_row)
+        score = 10.0 * event.score / event.max_score if event.max_score else 0.0
+
+        self.sums[row, col] += score
+        self.counts[row, col] += 1
+        self.class_sums[class_row, col] += score
+        self.class_counts[class_row, col] += 1
+
+        weak = self._weak.setdefault((class_row, col), set())
+        if self.sums[row, col] / self.counts[row, col] < self.threshold:
+            weak.add(row)
+        else:
+            weak.discard(row)
+        self.events_applied += 1
+
+    def record_many(self, events):
+        for event in events:
+            self.record(event)
+
+    # --- Queries ---
+    def weak_students(self, skill, class_id=None):
+        col = SKILLS.index(skill)
+        if class_id is not None:
+            class_row = self._class_index.get(class_id)
+            rows = self._weak.get((class_row, col), set()) if class_row is not None else set()
+        else:
+            rows = set().union(*(s for (c, k), s in self._weak.items() if k == col))
+        return sorted(self.student_ids[r] for r in rows)
+
+    def student_averages(self, student):
+        row = self._student_index[student]
+        return self._averages(self.sums[row], self.counts[row])
+
+    def weak_areas(self, student):
+        averages = self.student_averages(student)
+        return [s for s in SKILLS if averages[s] is not None and averages[s] < self.threshold]
+
+    def class_averages(self, class_id):
+        row = self._class_index[class_id]
+        return self._averages(self.class_sums[row], self.class_counts[row])
+
+    @staticmethod
+    def _averages(sums, counts):
+        return {s: (float(sums[i] / counts[i]) if counts[i] else None) for i, s in enumerate(SKILLS)}
+
+    def to_frame(self):
+        """Per-student averages as a DataFrame shaped like tutor.py's input."""
+        import pandas as pd
+        n = len(self.student_ids)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = self.sums[:n] / self.counts[:n]
+        df = pd.DataFrame(averages, columns=SKILLS)
+        df.insert(0, "student", self.student_ids)
+        df.insert(1, "class_id", [self.class_ids[c] for c in self.class_of[:n]])
+        return df
+
+    # --- Snapshots ---
+    def save_snapshot(self, path):
+        """Compact columnar snapshot; pair with AttemptLog.replay(skip=events_applied)."""
+        n, c = len(self.student_ids), len(self.class_ids)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            sums=self.sums[:n], counts=self.counts[:n],
+            class_of=self.class_of[:n],
+            class_sums=self.class_sums[:c], class_counts=self.class_counts[:c],
+            student_ids=np.array(self.student_ids, dtype=object),
+            class_ids=np.array(self.class_ids, dtype=object),
+            meta=np.array([self.threshold, self.events_applied], dtype=np.float64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_snapshot(cls, path):
+        data = np.load(path, allow_pickle=True)
+        threshold, events_applied = data["meta"]
+        agg = cls(threshold=float(threshold), capacity=max(len(data["student_ids"]), 1))
+        agg.events_applied = int(events_applied)
+        for class_id in data["class_ids"]:
+            agg._class_row(class_id)
+        for student in data["student_ids"]:
+            agg._student_index[student] = len(agg.student_ids)
+            agg.student_ids.append(student)
+
+        n, c = len(agg.student_ids), len(agg.class_ids)
+        agg.sums[:n] = data["sums"]
+        agg.counts[:n] = data["counts"]
+        agg.class_of[:n] = data["class_of"]
+        agg.class_sums[:c] = data["class_sums"]
+        agg.class_counts[:c] = data["class_counts"]
+
+        # Rebuild weak sets column-wise from the snapshot, once
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weak = (agg.sums[:n] / agg.counts[:n]) < agg.threshold
+        for col in range(len(SKILLS)):
+            for row in np.nonzero(weak[:, col])[0]:
+                agg._weak.setdefault((int(agg.class_of[row]), col), set()).add(int(row))
+        return agg
+
+def restore(snapshot_path, log):
+    """Latest state: the snapshot (if any) plus every logged attempt after it."""
+    agg = WeakAreaAggregator.load_snapshot(snapshot_path) if os.path.exists(snapshot_path) else WeakAreaAggregator()
+    agg.record_many(log.replay(skip=agg.events_applied))
+    return agg
@@ -1,11 +1,19 @@
+import argparse
+import os
+import numpy as np
 import pandas as pd
+import joblib
 from sklearn.multioutput import MultiOutputClassifier
 from sklearn.ensemble import RandomForestClassifier
 
+SKILLS = ['VSO', 'Pronouns', 'Affix']
+DEFAULT_THRESHOLD = 6  # below this is considered weak
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tutor_model.joblib")
+
 # --------------------------
 # Sample historical data
 # --------------------------
-data = [
+SAMPLE_DATA = [
     {"student":"Juan","VSO":8,"Pronouns":6,"Affix":4},
     {"student":"Maria","VSO":9,"Pronouns":8,"Affix":9},
     {"student":"Pedro","VSO":5,"Pronouns":4,"Affix":6},
@@ -13,78 +21,204 @@ data = [
     {"student":"Luis","VSO":7,"Pronouns":5,"Affix":6},
 ]
 
-df = pd.DataFrame(data)
-
 # --------------------------
 # Weak area detection
 # --------------------------
-threshold = 6  # below this is considered weak
-
-def get_weak_areas(row, threshold=6):
+def get_weak_areas(row, threshold=DEFAULT_THRESHOLD):
     weak = []
-    for col in ['VSO','Pronouns','Affix']:
+    for col in SKILLS:
         if row[col] < threshold:
             weak.append(col)
     return weak
 
-df['WeakAreas'] = df.apply(get_weak_areas, axis=1)
+def weak_area_matrix(scores, threshold=DEFAULT_THRESHOLD):
+    """Boolean (students x skills) matrix of weak areas, computed column-wise."""
+    return scores[SKILLS].to_numpy() < threshold
 
 # --------------------------
 # Feedback generator
 # --------------------------
+EXERCISES = {
+    "VSO": "Practice VSO sentence ordering exercises.",
+    "Pronouns": "Review pronoun usage in sentences.",
+    "Affix": "Do affix drills and root word transformations."
+}
+
 def generate_feedback(weak_areas):
     if not weak_areas:
         return "Excellent! Keep up the good work."
     feedback = "Student needs to improve " + ", ".join(weak_areas) + ". Suggested exercises: "
-    exercises = {
-        "VSO": "Practice VSO sentence ordering exercises.",
-        "Pronouns": "Review pronoun usage in sentences.",
-        "Affix": "Do affix drills and root word transformations."
-    }
-    feedback += "; ".join([exercises[w] for w in weak_areas])
+    feedback += "; ".join([EXERCISES[w] for w in weak_areas])
     return feedback
 
-df['Feedback'] = df['WeakAreas'].apply(generate_feedback)
+# Every combination of weak skills is one bit pattern, so feedback for a whole
+# class is a single table lookup instead of a per-row function call.
+_SKILL_BITS = 1 << np.arange(len(SKILLS))
+WEAK_AREAS_BY_MASK = [[s for i, s in enumerate(SKILLS) if mask & (1 << i)] for mask in range(1 << len(SKILLS))]
+FEEDBACK_BY_MASK = np.array([generate_feedback(areas) for areas in WEAK_AREAS_BY_MASK], dtype=object)
+
+def _describe(weak):
+    masks = weak.astype(np.int64) @ _SKILL_BITS
+    weak_areas = [WEAK_AREAS_BY_MASK[m] for m in masks]
+    return weak_areas, FEEDBACK_BY_MASK[masks]
+
+def label_weak_areas(df, threshold=DEFAULT_THRESHOLD):
+    """Adds WeakAreas, Feedback and <skill>_weak columns to a copy of `df`."""
+    df = df.copy()
+    weak = weak_area_matrix(df, threshold)
+    df['WeakAreas'], df['Feedback'] = _describe(weak)
+    for i, col in enumerate(SKILLS):
+        df[col + '_weak'] = weak[:, i].astype(int)
+    return df
 
 # --------------------------
-# Train AI model for weak area prediction
+# Train / persist / load
 # --------------------------
-# Convert WeakAreas to binary columns
-for col in ['VSO','Pronouns','Affix']:
-    df[col+'_weak'] = df['WeakAreas'].apply(lambda x: 1 if col in x else 0)
-
-X = df[['VSO','Pronouns','Affix']]
-y = df[['VSO_weak','Pronouns_weak','Affix_weak']]
-
-model = MultiOutputClassifier(RandomForestClassifier())
-model.fit(X, y)
+def _training_arrays(df, threshold):
+    X = df[SKILLS].to_numpy(dtype=np.float32)
+    y = weak_area_matrix(df, threshold).astype(np.int8)
+    return X, y
+
+def train_model(df, threshold=DEFAULT_THRESHOLD, n_estimators=100):
+    X, y = _training_arrays(df, threshold)
+    # warm_start lets retrain_model add trees later without refitting the old ones
+    model = MultiOutputClassifier(RandomForestClassifier(n_estimators=n_estimators, warm_start=True))
+    model.fit(X, y)
+    return {"model": model, "threshold": threshold, "skills": SKILLS, "X": X, "y": y}
+
+def save_model(artifact, path=DEFAULT_MODEL_PATH):
+    tmp_path = path + ".tmp"
+    joblib.dump(artifact, tmp_path, compress=3)
+    os.replace(tmp_path, path)
+
+_loaded = {}
+
+def load_model(path=DEFAULT_MODEL_PATH):
+    """Loads a saved artifact once per (path, mtime) and reuses it afterwards."""
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    if key not in _loaded:
+        _loaded.clear()
+        _loaded[key] = joblib.load(path)
+    return _loaded[key]
+
+def retrain_model(artifact, new_df, extra_estimators=20):
+    """
+    Incremental retrain: appends the new students to the stored training
+    set and grows each forest by `extra_estimators` trees fitted on it.
+    Existing trees are kept as they are.
+    """
+    X_new, y_new = _training_arrays(new_df, artifact["threshold"])
+    X = np.vstack([artifact["X"], X_new])
+    y = np.vstack([artifact["y"], y_new])
+    model = artifact["model"]
+    for i, forest in enumerate(model.estimators_):
+        forest.n_estimators += extra_estimators
+        forest.fit(X, y[:, i])
+    return dict(artifact, X=X, y=y)
 
 # --------------------------
-# Console input for new student
+# Batch scoring
 # --------------------------
-print("=== Filipino Grammar AI Tutor ===")
-vso_score = int(input("Enter VSO score (0-10): "))
-pronouns_score = int(input("Enter Pronouns score (0-10): "))
-affix_score = int(input("Enter Affix score (0-10): "))
-
-new_student = pd.DataFrame({"VSO":[vso_score],"Pronouns":[pronouns_score],"Affix":[affix_score]})
-predicted_weak = model.predict(new_student)[0]
-predicted_weak_areas = [col.replace("_weak","") for col,val in zip(y.columns,predicted_weak) if val==1]
-
-feedback = generate_feedback(predicted_weak_areas)
+def score_students(artifact, scores):
+    """
+    Predicts weak areas and feedback for every row of `scores` (a DataFrame
+    with VSO, Pronouns and Affix columns) in one vectorized call.
+    """
+    X = scores[SKILLS].to_numpy(dtype=np.float32)
+    predicted = np.asarray(artifact["model"].predict(X)).astype(bool)
+    result = scores.copy()
+    result['WeakAreas'], result['Feedback'] = _describe(predicted)
+    for i, col in enumerate(SKILLS):
+        result[col + '_weak'] = predicted[:, i].astype(int)
+    return result
+
+class TutorService:
+    """Holds one loaded model for repeated scoring and periodic retraining."""
+
+    def __init__(self, path=DEFAULT_MODEL_PATH):
+        self.path = path
+        if not os.path.exists(path):
+            save_model(train_model(pd.DataFrame(SAMPLE_DATA)), path)
+        self.artifact = load_model(path)
+
+    def score(self, scores):
+        if not isinstance(scores, pd.DataFrame):
+            scores = pd.DataFrame(scores)
+        return score_students(self.artifact, scores)
+
+    def retrain(self, new_scores, extra_estimators=20):
+        if not isinstance(new_scores, pd.DataFrame):
+            new_scores = pd.DataFrame(new_scores)
+        self.artifact = retrain_model(self.artifact, new_scores, extra_estimators)
+        save_model(self.artifact, self.path)
 
 # --------------------------
-# Output results
+# Command line
 # --------------------------
-print("\n=== Analysis Result ===")
-if predicted_weak_areas:
-    print(f"Weak Areas Detected: {', '.join(predicted_weak_areas)}")
-else:
-    print("No weak areas detected! Excellent performance.")
-
-print("Feedback:")
-print(feedback)
-
-# Show historical student performance
-print("\n=== Historical Performance ===")
-print(df[['student','VSO','Pronouns','Affix','WeakAreas','Feedback']])
+def _read_scores(path):
+    return pd.DataFrame(SAMPLE_DATA) if path is None else pd.read_csv(path)
+
+def interactive(service):
+    print("=== Filipino Grammar AI Tutor ===")
+    vso_score = int(input("Enter VSO score (0-10): "))
+    pronouns_score = int(input("Enter Pronouns score (0-10): "))
+    affix_score = int(input("Enter Affix score (0-10): "))
+
+    result = service.score({"VSO":[vso_score],"Pronouns":[pronouns_score],"Affix":[affix_score]})
+    predicted_weak_areas = result['WeakAreas'].iloc[0]
+
+    # --------------------------
+    # Output results
+    # --------------------------
+    print("\n=== Analysis Result ===")
+    if predicted_weak_areas:
+        print(f"Weak Areas Detected: {', '.join(predicted_weak_areas)}")
+    else:
+        print("No weak areas detected! Excellent performance.")
+
+    print("Feedback:")
+    print(result['Feedback'].iloc[0])
+
+    # Show historical student performance
+    print("\n=== Historical Performance ===")
+    print(label_weak_areas(pd.DataFrame(SAMPLE_DATA))[['student','VSO','Pronouns','Affix','WeakAreas','Feedback']])
+
+def main():
+    parser = argparse.ArgumentParser(description="Filipino Grammar AI Tutor")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Model artifact path")
+    sub = parser.add_subparsers(dest="command")
+
+    train = sub.add_parser("train", help="Train and save the weak-area model")
+    train.add_argument("--data", help="CSV with VSO, Pronouns, Affix columns (default: sample data)")
+    train.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD)
+    train.add_argument("--estimators", type=int, default=100)
+
+    score = sub.add_parser("score", help="Score a CSV of students in one batch")
+    score.add_argument("--data", required=True)
+    score.add_argument("--out", help="Write results to this CSV instead of stdout")
+
+    retrain = sub.add_parser("retrain", help="Grow the saved model with new students")
+    retrain.add_argument("--data", required=True)
+    retrain.add_argument("--estimators", type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        artifact = train_model(_read_scores(args.data), args.threshold, args.estimators)
+        save_model(artifact, args.model)
+        print(f"Saved model trained on {len(artifact['X'])} students to {args.model}")
+    elif args.command == "score":
+        result = TutorService(args.model).score(_read_scores(args.data))
+        if args.out:
+            result.to_csv(args.out, index=False)
+        else:
+            print(result)
+    elif args.command == "retrain":
+        service = TutorService(args.model)
+        service.retrain(_read_scores(args.data), args.estimators)
+        print(f"Model now trained on {len(service.artifact['X'])} students")
+    else:
+        interactive(TutorService(args.model))
+
+if __name__ == "__main__":
+    main()